@@ -5,15 +5,26 @@ Monitoring folder input, process foto, enhance dengan Cerebrium, upload ke R2
 
 import os
 import time
+import signal
+import threading
 from PIL import ImageFile
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 
 # Import modules yang sudah dipisah
-from config import INPUT_DIR, SUPPORTED_FORMATS
-from utils import load_counter, save_counter
-from processor import process_photo
-from uploader import check_r2_connection
+from config import (
+    INPUT_DIR, SUPPORTED_FORMATS, CATCHUP_SCAN_INTERVAL, ENABLE_RESULT_CACHE, ENABLE_PREWARM,
+    ENABLE_UPLOAD_RECONCILER
+)
+from utils import load_counter
+from pipeline import PhotoPipeline
+from jobstore import JobStore
+from scanner import catch_up_scan
+from completion import CompletionTracker
+from uploader import check_r2_connection, abort_stale_multipart_uploads
+from result_cache import get_cache
+from warmup import Prewarmer
+from reconciler import UploadReconciler
 
 # Setup PIL untuk handle truncated images
 ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -26,11 +37,15 @@ for directory in [INPUT_DIR, BACKUP_DIR, RAW_BACKUP_DIR, JPG_BACKUP_DIR, WORK_DI
 
 
 class PhotoHandler(FileSystemEventHandler):
-    """Handler untuk monitoring file baru di input directory"""
+    """
+    Handler untuk monitoring file baru di input directory
+    Foto masuk pipeline saat CompletionTracker menganggap file selesai ditulis
+    """
     
-    def __init__(self):
-        self.counter = load_counter()
-        print(f"📊 Starting with counter: {self.counter}")
+    def __init__(self, pipeline, prewarmer=None):
+        self.pipeline = pipeline
+        self.prewarmer = prewarmer
+        self.tracker = CompletionTracker(self.on_complete)
     
     def on_created(self, event):
         """Handle file baru yang dibuat di input directory"""
@@ -38,19 +53,65 @@ class PhotoHandler(FileSystemEventHandler):
             return
         
         # Check if file is supported format
-        file_path = event.src_path.lower()
-        if file_path.endswith(SUPPORTED_FORMATS):
+        if self.tracker.is_supported(event.src_path):
             print(f"📸 Detected: {os.path.basename(event.src_path)}")
-            
-            # Process photo
-            success = process_photo(event.src_path, self.counter)
-            
-            if success:
-                self.counter += 1
-                save_counter(self.counter)
-                print(f"✅ Photo processed successfully. Next counter: {self.counter}")
-            else:
-                print(f"❌ Photo processing failed")
+            # Foto masih ditransfer: hangatkan container Cerebrium sekarang
+            if self.prewarmer is not None:
+                self.prewarmer.notify_activity()
+        self.tracker.file_created(event.src_path)
+    
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.tracker.file_modified(event.src_path)
+    
+    def on_closed(self, event):
+        """Close-after-write (inotify IN_CLOSE_WRITE): file selesai ditulis"""
+        if not event.is_directory:
+            self.tracker.file_closed(event.src_path)
+    
+    def on_moved(self, event):
+        """Rename ke nama final (inotify IN_MOVED_TO), mis. dari tethering app"""
+        if not event.is_directory:
+            self.tracker.file_moved(event.src_path, event.dest_path)
+    
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.tracker.file_deleted(event.src_path)
+    
+    def on_complete(self, path):
+        """Queue photo ke pipeline (decode → enhance → upload berjalan di worker)"""
+        self.pipeline.submit(path, complete=True)
+
+
+_scan_lock = threading.Lock()
+
+
+def start_catch_up_scan(pipeline, store):
+    """Jalankan catch-up scan di background (skip jika scan sebelumnya masih jalan)"""
+    def run():
+        if not _scan_lock.acquire(blocking=False):
+            return
+        try:
+            catch_up_scan(pipeline, store)
+        except Exception as e:
+            print(f"⚠️ Catch-up scan failed: {e}")
+        finally:
+            _scan_lock.release()
+
+    threading.Thread(target=run, name="catch-up-scan", daemon=True).start()
+
+
+def cleanup_multipart_uploads(store):
+    """Abort multipart upload yang melewati MULTIPART_UPLOAD_TTL (background, saat startup)"""
+    def run():
+        try:
+            aborted = abort_stale_multipart_uploads(store)
+            if aborted:
+                print(f"🧹 Aborted {aborted} stale multipart upload(s) in R2")
+        except Exception as e:
+            print(f"⚠️ Multipart cleanup failed: {e}")
+
+    threading.Thread(target=run, name="multipart-cleanup", daemon=True).start()
 
 
 def main():
@@ -64,10 +125,12 @@ def main():
         print("⚠️ Warning: R2 connection failed. Files will be saved locally only.")
     
     # Check Cerebrium API endpoint and show AI enhancement info
-    from config import CEREBRIUM_API, ENHANCEMENT_TASK, TASK_OPTIONS, ACTIVE_TASK_TYPE
+    from config import CEREBRIUM_API, CEREBRIUM_ENDPOINTS, ENHANCEMENT_TASK, TASK_OPTIONS, ACTIVE_TASK_TYPE
     if "your-app-name" in CEREBRIUM_API:
         print("⚠️ WARNING: Please update CEREBRIUM_API in config.py with your actual app name!")
         print(f"   Current: {CEREBRIUM_API}")
+    if len(CEREBRIUM_ENDPOINTS) > 1:
+        print(f"🌐 Routing across {len(CEREBRIUM_ENDPOINTS)} Cerebrium endpoints")
     
     # Display AI enhancement configuration
     print(f"📁 Monitoring folder: {INPUT_DIR}/")
@@ -97,21 +160,83 @@ def main():
     print("💡 To change task: Edit ACTIVE_TASK_TYPE in config.py")
     print("=" * 60)
     
+    # Setup processing pipeline
+    counter = load_counter()
+    print(f"📊 Starting with counter: {counter}")
+    store = JobStore()
+    cleanup_multipart_uploads(store)
+    
+    # Upload yang gagal (termasuk failed_uploads.txt lama) dikirim ulang di background
+    reconciler = UploadReconciler(store) if ENABLE_UPLOAD_RECONCILER else None
+    if reconciler is not None:
+        imported = reconciler.import_failed_log()
+        if imported:
+            print(f"📥 Imported {imported} entries from failed_uploads.txt into the upload retry queue")
+        pending = store.pending_uploads()
+        if pending:
+            print(f"📮 Upload retry queue: {pending} pending")
+        reconciler.start()
+    
+    pipeline = PhotoPipeline(counter, store, reconciler=reconciler)
+    pipeline.start()
+    
+    # Pre-warm Cerebrium saat aktivitas ingest dimulai setelah idle
+    prewarmer = Prewarmer() if ENABLE_PREWARM else None
+    if prewarmer is not None:
+        prewarmer.start()
+    
     # Setup file monitoring
-    event_handler = PhotoHandler()
+    event_handler = PhotoHandler(pipeline, prewarmer)
+    event_handler.tracker.start()
     observer = Observer()
     observer.schedule(event_handler, INPUT_DIR, recursive=False)
     observer.start()
     
+    # Lanjutkan job yang belum selesai dari sesi sebelumnya, lalu scan file yang
+    # masuk saat aplikasi mati. Jalan di background setelah observer start, supaya
+    # tidak ada file yang terlewat dan monitoring tidak menunggu queue pipeline.
+    def catch_up():
+        if pipeline.resume_pending() and prewarmer is not None:
+            prewarmer.notify_activity()
+        start_catch_up_scan(pipeline, store)
+    
+    threading.Thread(target=catch_up, name="resume", daemon=True).start()
+    
+    # On-demand scan: kill -USR1 <pid>
+    scan_requested = threading.Event()
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: scan_requested.set())
+    last_scan = time.time()
+    
     try:
         print("✨ Ready! Drop photos into the input folder...")
         while True:
             time.sleep(1)
+            periodic = CATCHUP_SCAN_INTERVAL and time.time() - last_scan >= CATCHUP_SCAN_INTERVAL
+            if scan_requested.is_set() or periodic:
+                scan_requested.clear()
+                last_scan = time.time()
+                start_catch_up_scan(pipeline, store)
     except KeyboardInterrupt:
         print("\n🛑 Stopping monitoring...")
         observer.stop()
     
     observer.join()
+    event_handler.tracker.stop()
+    if prewarmer is not None:
+        prewarmer.stop()
+        if prewarmer.cold_starts:
+            print(f"🧊 Cold starts this session: " + ", ".join(f"{s:.1f}s" for s in prewarmer.cold_starts))
+    print("⏳ Finishing photos already in the pipeline...")
+    pipeline.stop()
+    if reconciler is not None:
+        reconciler.stop()
+        pending = store.pending_uploads()
+        if pending:
+            print(f"📮 {pending} upload(s) still pending, retried on next start")
+    store.close()
+    if ENABLE_RESULT_CACHE:
+        print(f"💾 Result cache: {get_cache().summary()}")
     print("👋 Goodbye!")
 
 
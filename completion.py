@@ -0,0 +1,145 @@
+"""
+Deteksi file selesai ditulis berbasis event watchdog
+File siap diproses saat ada close-after-write (inotify IN_CLOSE_WRITE) atau
+rename ke nama final (IN_MOVED_TO). File yang di-move dari folder lain (hanya
+event create) langsung siap jika mtime-nya sudah lebih lama dari window
+stabilitas. Polling ukuran file hanya dipakai sebagai fallback untuk file yang
+tidak pernah mendapat event tersebut.
+"""
+
+import os
+import threading
+import time
+from config import (
+    SUPPORTED_FORMATS, FILE_STABILITY_CHECKS, FILE_STABILITY_INTERVAL, FILE_COMPLETE_TIMEOUT
+)
+
+
+class _PendingFile:
+    """State polling untuk satu file yang belum selesai ditulis"""
+
+    def __init__(self):
+        self.last_size = -1
+        self.stable_count = 0
+        self.last_change = time.time()
+
+
+class CompletionTracker:
+    """
+    Melacak file baru di input directory dan memanggil on_complete(path)
+    tepat satu kali saat file selesai ditulis
+    """
+
+    def __init__(self, on_complete,
+                 checks=FILE_STABILITY_CHECKS,
+                 interval=FILE_STABILITY_INTERVAL,
+                 timeout=FILE_COMPLETE_TIMEOUT):
+        self.on_complete = on_complete
+        self.checks = checks
+        self.interval = interval
+        self.timeout = timeout
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._poller = None
+
+    def start(self):
+        self._poller = threading.Thread(target=self._poll_loop, name="completion-poller", daemon=True)
+        self._poller.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._poller is not None:
+            self._poller.join()
+
+    @staticmethod
+    def is_supported(path):
+        return path.lower().endswith(SUPPORTED_FORMATS)
+
+    def file_created(self, path):
+        """File baru muncul: tunggu event close/rename (atau fallback polling)"""
+        if not self.is_supported(path):
+            return
+        if self._already_written(path):
+            self._complete(path)
+            return
+        with self._lock:
+            self._pending.setdefault(path, _PendingFile())
+
+    def _already_written(self, path):
+        """
+        True jika file yang baru muncul sudah lengkap, mis. di-move dari folder
+        lain (rename antar directory hanya menghasilkan event create): ukuran > 0
+        dan mtime lebih lama dari window stabilitas (checks x interval, sama
+        dengan catch-up scan). File lain menunggu event close/rename atau polling.
+        """
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return False
+        return stat.st_size > 0 and time.time() - stat.st_mtime > self.checks * self.interval
+
+    def file_modified(self, path):
+        """File masih ditulis: reset hitungan stabilitas polling"""
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is not None:
+                pending.stable_count = 0
+
+    def file_closed(self, path):
+        """Close-after-write: file langsung siap"""
+        if self.is_supported(path):
+            self._complete(path)
+
+    def file_moved(self, src_path, dest_path):
+        """Atomic rename (mis. temp file dari tethering app) ke nama final"""
+        with self._lock:
+            self._pending.pop(src_path, None)
+        if self.is_supported(dest_path):
+            self._complete(dest_path)
+
+    def file_deleted(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+
+    def _complete(self, path):
+        with self._lock:
+            self._pending.pop(path, None)
+        self.on_complete(path)
+
+    def _poll_loop(self):
+        while not self._stop.wait(self.interval):
+            with self._lock:
+                paths = list(self._pending)
+            for path in paths:
+                self._poll(path)
+
+    def _poll(self, path):
+        try:
+            size = os.path.getsize(path)
+        except FileNotFoundError:
+            size = 0
+
+        with self._lock:
+            pending = self._pending.get(path)
+            if pending is None:
+                return
+            now = time.time()
+            if size == pending.last_size and size > 0:
+                pending.stable_count += 1
+                ready = pending.stable_count >= self.checks
+            else:
+                pending.stable_count = 0
+                if size != pending.last_size:
+                    pending.last_change = now
+                pending.last_size = size
+                ready = False
+            expired = not ready and now - pending.last_change > self.timeout
+            if ready or expired:
+                del self._pending[path]
+
+        if ready:
+            print(f"⏱️ No close event for {os.path.basename(path)}, size stable → processing")
+            self.on_complete(path)
+        elif expired:
+            print(f"⚠️ File not complete after {self.timeout}s: {os.path.basename(path)}")
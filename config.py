@@ -18,6 +18,22 @@ PUBLIC_DOMAIN = os.getenv("CLOUDFLARE_R2_PUBLIC_URL", "https://photos.hafiportra
 # -------- CEREBRIUM API CONFIG --------
 CEREBRIUM_API = "https://api.aws.us-east-1.cerebrium.ai/v4/p-82c79058/image-enhancement-v2/predict"
 CEREBRIUM_AUTH_TOKEN = os.getenv("CEREBRIUM_AUTH_TOKEN")
+# Versi model di endpoint; ganti jika model di-deploy ulang supaya hasil lama di cache tidak dipakai.
+# Key result cache tidak memuat URL endpoint, jadi versi ini berlaku untuk semua CEREBRIUM_ENDPOINTS
+CEREBRIUM_ENDPOINT_VERSION = os.getenv("CEREBRIUM_ENDPOINT_VERSION", "v2")
+
+# Semua deployment Cerebrium (region/app) yang dipakai bersamaan, masing-masing dengan
+# token sendiri. Request di-route ke endpoint dengan latency (EWMA) terendah; semua
+# endpoint harus menjalankan model yang sama (lihat CEREBRIUM_ENDPOINT_VERSION).
+# Contoh endpoint kedua:
+#   {"url": "https://api.aws.eu-west-2.cerebrium.ai/v4/<project>/image-enhancement-v2/predict",
+#    "token": os.getenv("CEREBRIUM_AUTH_TOKEN_EU")},
+CEREBRIUM_ENDPOINTS = [
+    {"url": CEREBRIUM_API, "token": CEREBRIUM_AUTH_TOKEN},
+]
+ROUTING_EWMA_ALPHA = 0.3  # bobot sample terbaru untuk EWMA latency / error rate
+ROUTING_EJECT_FAILURES = 3  # kegagalan berturut-turut sebelum endpoint di-eject
+ROUTING_EJECT_SECONDS = 60  # lama endpoint di-eject sebelum dicoba lagi
 
 # -------- AI ENHANCEMENT CONFIG --------
 # Available tasks: upscale, face_restore, full_enhance, denoise, crop_5r
@@ -33,6 +49,29 @@ TASK_OPTIONS = {
     "general": "full_enhance"         # Default: complete AI pipeline
 }
 
+# Batas resolusi input per AI task. Foto di-downscale sebelum dikirim ke Cerebrium
+# ke input terkecil yang masih mencapai max_output_long_edge setelah upscale server.
+#   scale: faktor upscale yang dilakukan server untuk task ini
+#   max_input_mp: batas megapixel input
+#   max_output_long_edge: sisi terpanjang hasil yang dibutuhkan (pixel)
+TASK_RESOLUTION_LIMITS = {
+    "full_enhance": {"scale": 4, "max_input_mp": 4, "max_output_long_edge": 8000},
+    "upscale": {"scale": 4, "max_input_mp": 4, "max_output_long_edge": 8000},
+    "face_restore": {"scale": 1, "max_input_mp": 24, "max_output_long_edge": 6000},
+    "denoise": {"scale": 1, "max_input_mp": 24, "max_output_long_edge": 6000},
+    "crop_5r": {"scale": 1, "max_input_mp": 24, "max_output_long_edge": 6000},
+}
+
+# Tiled enhancement: input yang lebih besar dari tile_size dipecah jadi tile yang
+# overlap (pixel di input), dikirim concurrent, lalu di-stitch dengan feathered seam.
+# Task tanpa entry tidak pernah di-tile (mis. crop_5r butuh seluruh frame,
+# GFPGAN bisa memotong wajah di seam).
+TASK_TILING = {
+    "upscale": {"tile_size": 768, "overlap": 32},
+    "denoise": {"tile_size": 1536, "overlap": 32},
+}
+TILE_WORKERS = 4  # jumlah tile per foto yang dikirim bersamaan
+
 # Current active task (change this to switch enhancement type)
 ACTIVE_TASK_TYPE = "general"  # Use portraits setting by default
 
@@ -48,24 +87,124 @@ ENHANCED_DIR = "enhanced"
 # Watermark settings
 ENABLE_WATERMARK = True
 WATERMARK_FILE = "watermark.png"  # Put your PNG watermark file here
+WATERMARK_CACHE_SIZE = 8  # jumlah ukuran watermark (hasil resize) yang disimpan di memory
+
+# JPEG encoding (backup + payload API)
+JPEG_QUALITY = 95
+
+# Payload API disimpan di memory dan langsung dikirim ke Cerebrium.
+# Set True untuk juga menulis payload ke WORK_DIR (debug)
+SAVE_WORK_FILES = False
 
 # File naming
 OUTPUT_PREFIX = "HFI-event"  # Prefix untuk nama file hasil
 
 # Upload retry settings
 MAX_UPLOAD_RETRIES = 3
-UPLOAD_RETRY_DELAY = 5  # seconds
+UPLOAD_RETRY_DELAY = 5  # seconds, retry dijadwalkan tanpa menahan worker upload
 
 # File processing settings
+# File dianggap selesai ditulis saat ada event close-after-write / rename (inotify).
+# Polling ukuran file hanya fallback untuk platform/transfer tanpa event tersebut.
 FILE_STABILITY_CHECKS = 3
 FILE_STABILITY_INTERVAL = 0.5  # seconds
+FILE_COMPLETE_TIMEOUT = 300  # seconds tanpa perubahan ukuran sebelum menyerah
 IMAGE_OPEN_RETRIES = 5
 
+# -------- PIPELINE CONFIG --------
+# Jumlah worker per stage: prepare (decode, backup, watermark),
+# enhance (request ke Cerebrium), upload (worker pool upload ke R2)
+PIPELINE_PREPARE_WORKERS = 2
+PIPELINE_ENHANCE_WORKERS = 4
+PIPELINE_UPLOAD_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 8  # max foto yang antri di depan tiap stage
+
+# Pool koneksi HTTP (keep-alive) ke Cerebrium: cukup untuk semua request bersamaan
+CEREBRIUM_POOL_SIZE = PIPELINE_ENHANCE_WORKERS * TILE_WORKERS
+
+# Multipart upload ke R2 (boto3 TransferConfig): file di atas threshold dikirim per part
+UPLOAD_MULTIPART_THRESHOLD = 8 * 1024 * 1024  # bytes
+UPLOAD_MULTIPART_CHUNKSIZE = 8 * 1024 * 1024  # bytes per part (minimal 5 MB)
+UPLOAD_MAX_CONCURRENCY = 4  # part yang diupload bersamaan per file
+
+# Multipart upload resumable: UploadId + ETag per part disimpan di JOB_DB, sehingga upload
+# yang terputus (laptop sleep / restart) hanya mengirim part yang belum ada di R2
+MULTIPART_UPLOAD_TTL = 24 * 3600  # seconds, multipart yang lebih lama di-abort saat startup
+
+# Catch-up scan INPUT_DIR untuk file yang masuk saat aplikasi mati.
+# Selalu jalan saat startup; on demand via SIGUSR1 (kill -USR1 <pid>).
+CATCHUP_SCAN_INTERVAL = 0  # seconds, 0 = tidak ada scan periodik
+
 # Supported file formats
 SUPPORTED_FORMATS = (".jpg", ".jpeg", ".png", ".cr2", ".nef", ".arw", ".dng")
 
+# -------- UPLOAD RETRY QUEUE --------
+# Upload yang tetap gagal setelah MAX_UPLOAD_RETRIES masuk retry queue di JOB_DB
+# dan dikirim ulang otomatis di background (entry lama di FAILED_UPLOADS_LOG ikut diimport)
+ENABLE_UPLOAD_RECONCILER = True
+UPLOAD_RECONCILE_INTERVAL = 10  # seconds antar pengecekan queue / koneksi R2
+UPLOAD_RECONCILE_WORKERS = 2  # upload retry yang berjalan bersamaan
+UPLOAD_RECONCILE_BASE_DELAY = 30  # seconds, backoff eksponensial per file
+UPLOAD_RECONCILE_MAX_DELAY = 1800  # seconds
+
+# Pool koneksi HTTP ke R2: cukup untuk semua part dari semua worker upload
+R2_POOL_SIZE = (PIPELINE_UPLOAD_WORKERS + UPLOAD_RECONCILE_WORKERS) * UPLOAD_MAX_CONCURRENCY
+
+# -------- CEREBRIUM RETRY --------
+# Retry untuk error sementara (timeout, koneksi putus, 429, 5xx); error 4xx tidak di-retry
+ENHANCE_MAX_RETRIES = 3
+ENHANCE_RETRY_BASE_DELAY = 2  # seconds, backoff eksponensial dengan jitter
+ENHANCE_RETRY_MAX_DELAY = 30  # seconds
+
+# Circuit breaker: setelah N kegagalan berturut-turut request ke Cerebrium ditahan
+# (queue menunggu, job tidak di-fail) lalu satu probe dicoba tiap CIRCUIT_RESET_TIMEOUT
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 30  # seconds
+CIRCUIT_MAX_WAIT = 600  # seconds maksimal satu foto menunggu endpoint pulih, 0 = tanpa batas
+
+# -------- LOCAL FALLBACK --------
+# Jika Cerebrium tidak tersedia (circuit open / error sementara setelah retry), foto
+# di-enhance di CPU lokal supaya hasil tetap terkirim. Kualitas lebih rendah dari AI.
+# False = foto menunggu di queue sampai Cerebrium pulih (lihat CIRCUIT_MAX_WAIT).
+ENABLE_LOCAL_FALLBACK = True
+LOCAL_ENGINE = "pillow"  # "pillow" atau "onnx" (butuh: pip install onnxruntime numpy)
+LOCAL_MAX_OUTPUT_LONG_EDGE = 4000  # pixel; batas hasil upscale lokal supaya tetap cepat
+LOCAL_ONNX_MODEL = os.getenv("LOCAL_ONNX_MODEL")  # path model Real-ESRGAN .onnx
+LOCAL_ONNX_TILE_SIZE = 256
+
+# -------- HEDGED REQUESTS --------
+# Jika request lebih lama dari persentil latency terbaru, kirim duplikat dan pakai
+# hasil yang datang duluan. Menambah biaya GPU, jadi dibatasi per menit.
+ENABLE_HEDGING = False
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 10  # request sukses per task sebelum hedging aktif
+HEDGE_WINDOW = 100  # jumlah latency terbaru yang dipakai untuk persentil
+HEDGE_BUDGET_PER_MINUTE = 5  # maksimal request duplikat per menit
+
+# -------- PRE-WARM --------
+# Kirim request kecil ke Cerebrium begitu file baru muncul setelah idle, supaya
+# cold start container sudah lewat saat foto pertama selesai ditransfer
+ENABLE_PREWARM = True
+PREWARM_IDLE_AFTER = 300  # seconds tanpa aktivitas sebelum container dianggap dingin
+PREWARM_TASK = "denoise"  # task paling ringan untuk warm-up
+PREWARM_COLD_THRESHOLD = 5  # seconds; warm-up lebih lama dari ini dilaporkan sebagai cold start
+# Keep-warm: ping berkala selama jam sesi foto, mis. ("08:00", "22:00"); None = nonaktif
+KEEP_WARM_WINDOW = None
+KEEP_WARM_INTERVAL = 240  # seconds
+
+# -------- RESULT CACHE --------
+# Cache hasil enhancement di disk, key = hash(payload, task, endpoint version).
+# Payload identik (re-run folder, retry) tidak dikirim ulang ke Cerebrium.
+ENABLE_RESULT_CACHE = True
+RESULT_CACHE_DIR = ".cache/results"
+RESULT_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB, entry terlama (LRU) dihapus duluan
+
 # -------- LOG FILES --------
 COUNTER_FILE = ".counter.txt"
 URLS_FILE = "urls.txt"
 ERROR_LOG = "error.log"
 FAILED_UPLOADS_LOG = "failed_uploads.txt"
+
+# -------- JOB STORE --------
+# SQLite (WAL mode) untuk checkpoint tiap stage, supaya job bisa di-resume setelah crash/restart
+JOB_DB = ".jobs.sqlite3"
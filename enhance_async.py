@@ -0,0 +1,167 @@
+"""
+Asyncio client untuk API Cerebrium
+Menjaga N request tetap berjalan bersamaan dan mengembalikan hasil begitu
+selesai, supaya batch besar bisa memanfaatkan scaling horizontal Cerebrium
+"""
+
+import io
+import asyncio
+import binascii
+from typing import AsyncIterator, Iterable, Tuple, Union
+from enhance_image_cerebrium import (
+    DEFAULT_TIMEOUT, RESPONSE_CHUNK_SIZE, StreamingPayload, ResponseImageDecoder, APIError, auth_headers,
+    get_client, is_retryable_status, truncate, _retry_after
+)
+
+# httpx opsional: tanpa httpx, request dijalankan lewat CerebriumClient di thread pool
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+# HTTP/2 hanya jika package h2 terinstall (pip install httpx[http2])
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def _streaming_payload(image: Union[str, bytes], task: str) -> StreamingPayload:
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return StreamingPayload(task, image_bytes=image)
+    return StreamingPayload(task, image_path=image)
+
+
+async def _aiter(payload: StreamingPayload):
+    for chunk in payload:
+        yield chunk
+
+
+async def _enhance_httpx(client, api_endpoint: str, image: Union[str, bytes], task: str) -> Tuple[bool, Union[bytes, str]]:
+    try:
+        payload = _streaming_payload(image, task)
+    except FileNotFoundError:
+        return False, f"File gambar tidak ditemukan: {image}"
+    except Exception as e:
+        return False, f"Error membaca file gambar: {str(e)}"
+
+    # Body di-stream dengan Content-Length pasti (tanpa chunked transfer);
+    # respons juga dibaca per chunk dan base64 di-decode incremental
+    buffer = io.BytesIO()
+    try:
+        async with client.stream("POST", api_endpoint, content=_aiter(payload),
+                                 headers={"Content-Length": str(len(payload))}) as response:
+            if response.status_code != 200:
+                await response.aread()
+                try:
+                    error_detail = truncate(response.json())
+                except Exception:
+                    error_detail = truncate(response.text)
+                return False, APIError(
+                    f"API error (status {response.status_code}): {error_detail}",
+                    retryable=is_retryable_status(response.status_code),
+                    status=response.status_code,
+                    retry_after=_retry_after(response),
+                )
+
+            decoder = ResponseImageDecoder(buffer)
+            async for chunk in response.aiter_bytes(RESPONSE_CHUNK_SIZE):
+                decoder.feed(chunk)
+            success, result = decoder.close()
+    except httpx.TimeoutException:
+        return False, APIError(f"Request timeout - API tidak merespons dalam {DEFAULT_TIMEOUT} detik", retryable=True)
+    except httpx.ConnectError:
+        return False, APIError(f"Tidak dapat terhubung ke API endpoint: {api_endpoint}", retryable=True)
+    except httpx.TransportError as e:
+        return False, APIError(f"Error saat mengirim request: {str(e)}", retryable=True)
+    except binascii.Error as e:
+        return False, f"Error decoding base64 image: {str(e)}"
+    except Exception as e:
+        return False, f"Error saat mengirim request: {str(e)}"
+
+    if not success:
+        return False, result
+    return True, buffer.getvalue()
+
+
+async def enhance_many(items: Union[Iterable, AsyncIterator], api_endpoint: str, auth_token: str = None,
+                       concurrency: int = 4) -> AsyncIterator[Tuple[object, bool, Union[bytes, str]]]:
+    """
+    Enhance banyak gambar dengan maksimal `concurrency` request bersamaan
+
+    Args:
+        items: Iterable (atau async iterable) berisi (image, task); image bisa
+            path file atau bytes. Item diambil secara lazy, jadi bisa berupa stream.
+        api_endpoint (str): URL lengkap ke endpoint predict Cerebrium
+        auth_token (str): Token Cerebrium (opsional)
+        concurrency (int): Jumlah request yang berjalan bersamaan
+
+    Yields:
+        tuple: ((image, task), success, image_bytes or error_message),
+            urut berdasarkan request yang selesai duluan
+    """
+    if hasattr(items, "__aiter__"):
+        iterator = items.__aiter__()
+
+        async def next_item():
+            try:
+                return await iterator.__anext__()
+            except StopAsyncIteration:
+                return None
+    else:
+        iterator = iter(items)
+
+        async def next_item():
+            return next(iterator, None)
+
+    if httpx is not None:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        headers = {"Content-Type": "application/json", **auth_headers(auth_token)}
+        client = httpx.AsyncClient(http2=HTTP2_AVAILABLE, limits=limits, headers=headers,
+                                   timeout=DEFAULT_TIMEOUT)
+
+        def start(image, task):
+            return _enhance_httpx(client, api_endpoint, image, task)
+    else:
+        # Fallback: client sync bersama (koneksi di-pool) di thread pool
+        client = None
+        sync_client = get_client(api_endpoint, auth_token, pool_size=concurrency)
+        loop = asyncio.get_running_loop()
+
+        def start(image, task):
+            if isinstance(image, (bytes, bytearray, memoryview)):
+                call = lambda: sync_client.enhance(task, image_bytes=image)
+            else:
+                call = lambda: sync_client.enhance(task, image_path=image)
+            return loop.run_in_executor(None, call)
+
+    in_flight = {}
+    exhausted = False
+    try:
+        while True:
+            # Isi slot yang kosong sampai `concurrency` request berjalan
+            while not exhausted and len(in_flight) < concurrency:
+                item = await next_item()
+                if item is None:
+                    exhausted = True
+                    break
+                image, task = item
+                in_flight[asyncio.ensure_future(start(image, task))] = item
+
+            if not in_flight:
+                break
+
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                item = in_flight.pop(future)
+                try:
+                    success, result = future.result()
+                except Exception as e:
+                    success, result = False, f"Unexpected error: {str(e)}"
+                yield item, success, result
+    finally:
+        for future in in_flight:
+            future.cancel()
+        if client is not None:
+            await client.aclose()
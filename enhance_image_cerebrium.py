@@ -3,134 +3,466 @@ Fungsi untuk mengirim gambar ke API Cerebrium untuk enhancement
 Dibuat sesuai spesifikasi task2.md
 """
 
+import io
+import os
+import re
+import json
+import mmap
 import base64
+import binascii
+import logging
+import threading
 import requests
+from requests.adapters import HTTPAdapter
 from typing import Tuple, Union
 
 
-def enhance_image_cerebrium(image_path: str, task: str, api_endpoint: str, auth_token: str = None) -> Tuple[bool, Union[bytes, str]]:
+DEFAULT_TIMEOUT = 120  # detik
+DEFAULT_POOL_SIZE = 10
+RESPONSE_CHUNK_SIZE = 64 * 1024
+DEBUG_TRUNCATE = 500  # karakter maksimal respons yang ditampilkan di debug log / error
+
+# Debug dump respons hanya muncul dengan logging level DEBUG
+logger = logging.getLogger(__name__)
+
+
+def build_payload(image_base64: str, task: str) -> dict:
+    """Payload JSON untuk endpoint predict Cerebrium"""
+    return {
+        "item": {
+            "image_base64": image_base64,
+            "task": task
+        }
+    }
+
+
+class StreamingPayload:
     """
-    Mengirim gambar lokal ke API Cerebrium untuk diproses dan mengembalikan hasil
+    Body JSON predict yang dihasilkan secara streaming
     
-    Args:
-        image_path (str): Path lengkap menuju file gambar di komputer lokal
-        task (str): Tugas yang ingin dilakukan ("upscale", "face_restore", "full_enhance", "denoise", "crop_5r")
-        api_endpoint (str): URL lengkap ke endpoint predict Cerebrium
+    Menghasilkan bytes yang sama dengan json.dumps(build_payload(...)), tetapi
+    gambar di-encode base64 per chunk saat body dikirim. Peak memory tetap
+    sekitar ukuran input (atau hanya satu chunk untuk file, lewat mmap), bukan
+    bytes + base64 + str + JSON. __len__ memberi Content-Length yang pasti,
+    sehingga requests tidak perlu chunked transfer.
+    """
+    
+    CHUNK_SIZE = 3 * 64 * 1024  # kelipatan 3 supaya tidak ada padding di tengah
+    
+    def __init__(self, task: str, image_bytes: bytes = None, image_path: str = None):
+        self.image_bytes = image_bytes
+        self.image_path = image_path
+        self.size = len(image_bytes) if image_bytes is not None else os.path.getsize(image_path)
+        self.prefix = b'{"item": {"image_base64": "'
+        self.suffix = b'", "task": ' + json.dumps(task).encode("utf-8") + b'}}'
+    
+    def __len__(self):
+        return len(self.prefix) + 4 * ((self.size + 2) // 3) + len(self.suffix)
+    
+    def __iter__(self):
+        yield self.prefix
+        if self.image_bytes is not None:
+            yield from self._encode(memoryview(self.image_bytes))
+        elif self.size:
+            with open(self.image_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield from self._encode(memoryview(mapped))
+        yield self.suffix
+    
+    def _encode(self, view):
+        try:
+            for offset in range(0, self.size, self.CHUNK_SIZE):
+                yield base64.b64encode(view[offset:offset + self.CHUNK_SIZE])
+        finally:
+            view.release()
+
+
+def parse_response_data(response_data) -> Tuple[bool, Union[bytes, str]]:
+    """
+    Ekstrak gambar hasil dari respons JSON Cerebrium
+    Format: {'result': {'processed_image': 'data:image/png;base64,...'}, 'run_time_ms': ...}
+    atau {'result': '<base64>'}
     
     Returns:
-        Tuple[bool, Union[bytes, str]]: 
-            - (True, image_bytes) jika berhasil
-            - (False, error_message) jika gagal
+        Tuple[bool, Union[bytes, str]]: (True, image_bytes) atau (False, error_message)
     """
+    if "result" in response_data:
+        result = response_data["result"]
+    
+        # Cek jika ada error di result
+        if isinstance(result, dict) and "error" in result:
+            return False, f"API error: {result['error']}"
     
+        # Cek berbagai format result
+        if isinstance(result, dict) and "processed_image" in result:
+            processed_image_data = result["processed_image"]
+        elif isinstance(result, str):
+            processed_image_data = result
+        else:
+            return False, f"Format result tidak dikenali: {truncate(result)}"
+    else:
+        return False, f"Response tidak mengandung 'result'. Response: {truncate(response_data)}"
+    
+    # Ekstrak base64 string dari format "data:image/png;base64,..."
     try:
-        # 1. Baca file gambar dan konversi ke base64
-        print(f"Membaca gambar dari: {image_path}")
-        
+        if processed_image_data.startswith("data:image/"):
+            # Hapus prefix "data:image/png;base64," atau serupa
+            base64_string = processed_image_data.split(",", 1)[1]
+        else:
+            # Asumsikan sudah pure base64
+            base64_string = processed_image_data
+    
+        # Konversi base64 ke bytes
+        return True, base64.b64decode(base64_string)
+    
+    except Exception as e:
+        return False, f"Error decoding base64 image: {str(e)}"
+
+
+class APIError(str):
+    """
+    Pesan error dari CerebriumClient (tetap str biasa untuk caller lama) plus
+    klasifikasi untuk retry: timeout, koneksi putus, 429 dan 5xx → retryable;
+    4xx dan error payload/format → tidak
+    """
+    
+    def __new__(cls, message, retryable=False, status=None, retry_after=None):
+        error = super().__new__(cls, message)
+        error.retryable = retryable
+        error.status = status
+        error.retry_after = retry_after
+        return error
+
+
+def is_retryable(error) -> bool:
+    return getattr(error, "retryable", False)
+
+
+def is_retryable_status(status: int) -> bool:
+    return status in (408, 429) or status >= 500
+
+
+def _retry_after(response):
+    """Header Retry-After (detik) jika ada, untuk 429/503"""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def truncate(text, limit: int = DEBUG_TRUNCATE) -> str:
+    """Potong teks panjang (mis. respons berisi base64) untuk log / pesan error"""
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}... ({len(text)} chars)"
+
+
+class ResponseImageDecoder:
+    """
+    Parser incremental untuk respons predict Cerebrium
+
+    Body di-feed per chunk. Begitu string `processed_image` (atau `result`
+    berupa string) ditemukan, prefix `data:image/...;base64,` dibuang dan
+    base64 di-decode per chunk langsung ke `sink` (file atau BytesIO), tanpa
+    menyimpan body, dict JSON, atau string base64 utuh di memory.
+
+    Respons lain (error, format tidak dikenali) tidak pernah besar: body-nya
+    di-buffer lalu diproses lewat parse_response_data seperti biasa.
+    """
+
+    _KEY = re.compile(rb'"(?:processed_image|result)"\s*:\s*"')
+    # Prefix data URL, juga dengan "/" yang di-escape JSON (data:image\/jpeg;base64,)
+    _DATA_URL = re.compile(rb'data:image(?:\\?/)[^,"]*,')
+
+    def __init__(self, sink):
+        self.sink = sink
+        self.size = 0
+        self.head = b""  # awal body, untuk debug log
+        self._buffer = bytearray()
+        self._carry = b""
+        self._state = "search"
+
+    def feed(self, chunk: bytes):
+        if len(self.head) < DEBUG_TRUNCATE:
+            self.head += chunk[:DEBUG_TRUNCATE - len(self.head)]
+        if self._state == "search":
+            self._buffer += chunk
+            match = self._KEY.search(self._buffer)
+            if match is None:
+                return
+            rest = bytes(self._buffer[match.end():])
+            self._buffer = bytearray()
+            self._state = "prefix"
+            self._feed_string(rest)
+        elif self._state in ("prefix", "data"):
+            self._feed_string(chunk)
+
+    def _feed_string(self, data: bytes):
+        if self._state == "prefix":
+            # Tunggu sampai cukup bytes untuk tahu ada prefix data URL atau tidak
+            self._buffer += data
+            if self._buffer.startswith(b"data:"):
+                match = self._DATA_URL.match(self._buffer)
+                if match is None:
+                    return
+                data = bytes(self._buffer[match.end():])
+            elif len(self._buffer) < 5 and b"data:".startswith(bytes(self._buffer)) and b'"' not in self._buffer:
+                return
+            else:
+                data = bytes(self._buffer)
+            self._buffer = bytearray()
+            self._state = "data"
+
+        end = data.find(b'"')
+        if end >= 0:
+            data = data[:end]
+            self._state = "done"
+        self._decode(data)
+
+    def _decode(self, data: bytes):
+        data = self._carry + data
+        # JSON boleh meng-escape "/" (\/) dan newline base64 (\n)
+        if data.endswith(b"\\"):
+            data, tail = data[:-1], b"\\"
+        else:
+            tail = b""
+        if b"\\" in data:
+            data = data.replace(b"\\/", b"/").replace(b"\\n", b"").replace(b"\\r", b"")
+        aligned = len(data) - len(data) % 4 if self._state != "done" else len(data)
+        if aligned:
+            decoded = binascii.a2b_base64(data[:aligned])
+            self.sink.write(decoded)
+            self.size += len(decoded)
+        self._carry = data[aligned:] + tail
+
+    def close(self) -> Tuple[bool, Union[int, str]]:
+        """
+        Selesaikan parsing setelah body habis
+
+        Returns:
+            Tuple[bool, Union[int, str]]: (True, jumlah bytes gambar) atau (False, error_message)
+        """
+        if self._state == "done":
+            return True, self.size
+        if self._state != "search":
+            return False, APIError("Response terpotong sebelum data gambar selesai", retryable=True)
+
+        # processed_image tidak ditemukan: body kecil, parse biasa untuk pesan error
         try:
-            with open(image_path, 'rb') as image_file:
-                image_data = image_file.read()
-                image_base64 = base64.b64encode(image_data).decode('utf-8')
-        except FileNotFoundError:
-            return False, f"File gambar tidak ditemukan: {image_path}"
+            response_data = json.loads(bytes(self._buffer))
         except Exception as e:
-            return False, f"Error membaca file gambar: {str(e)}"
+            logger.debug("Raw response text: %s", truncate(bytes(self._buffer)))
+            return False, f"Error parsing JSON response: {str(e)}"
+        success, result = parse_response_data(response_data)
+        if not success:
+            return False, result
+        self.sink.write(result)
+        self.size += len(result)
+        return True, self.size
+
+
+def auth_headers(auth_token: str = None) -> dict:
+    """Header Authorization (Bearer) jika token diberikan"""
+    if not auth_token:
+        return {}
+    # Check if token already has Bearer prefix
+    if auth_token.startswith("Bearer "):
+        return {"Authorization": auth_token}
+    return {"Authorization": f"Bearer {auth_token}"}
+
+
+class CerebriumClient:
+    """
+    Client untuk API Cerebrium dengan requests.Session yang di-pool
+    
+    Koneksi (TCP + TLS) dipakai ulang antar request (keep-alive), jadi hanya
+    request pertama yang membayar handshake ke endpoint. Satu instance aman
+    dipakai bersama oleh banyak thread; pool_size sebaiknya >= jumlah request
+    yang berjalan bersamaan.
+    """
+    
+    def __init__(self, api_endpoint: str, auth_token: str = None,
+                 pool_size: int = DEFAULT_POOL_SIZE, timeout: float = DEFAULT_TIMEOUT):
+        self.api_endpoint = api_endpoint
+        self.timeout = timeout
+        self.pool_size = pool_size
         
-        # 2. Buat payload JSON - format untuk Cerebrium
-        payload = {
-            "item": {
-                "image_base64": image_base64,
-                "task": task
-            }
-        }
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, pool_block=False)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
         
-        # 3. Setup headers
-        headers = {
-            "Content-Type": "application/json"
-        }
+        self.session.headers.update({"Content-Type": "application/json"})
+        self.session.headers.update(auth_headers(auth_token))
+    
+    def close(self):
+        self.session.close()
+    
+    def enhance(self, task: str, image_path: str = None, image_bytes: bytes = None,
+                cancel: threading.Event = None) -> Tuple[bool, Union[bytes, str]]:
+        """
+        Mengirim gambar ke API Cerebrium untuk diproses dan mengembalikan hasil
         
-        # Add authorization header if token provided
-        if auth_token:
-            # Check if token already has Bearer prefix
-            if auth_token.startswith("Bearer "):
-                headers["Authorization"] = auth_token
-            else:
-                headers["Authorization"] = f"Bearer {auth_token}"
+        Args:
+            task (str): Tugas yang ingin dilakukan ("upscale", "face_restore", "full_enhance", "denoise", "crop_5r")
+            image_path (str): Path lengkap menuju file gambar di komputer lokal
+            image_bytes (bytes): Data gambar yang sudah ada di memory; jika diisi,
+                image_path tidak dibaca dari disk
+            cancel (threading.Event): Jika di-set, request dihentikan begitu respons
+                mulai diterima (koneksi ditutup tanpa membaca body)
         
-        print(f"Mengirim request ke API dengan task: {task}")
+        Returns:
+            Tuple[bool, Union[bytes, str]]: 
+                - (True, image_bytes) jika berhasil
+                - (False, error_message) jika gagal
+        """
+        buffer = io.BytesIO()
+        success, result = self._request(task, buffer, image_path=image_path, image_bytes=image_bytes,
+                                        cancel=cancel)
+        if not success:
+            return False, result
+        return True, buffer.getvalue()
+    
+    def enhance_to_file(self, task: str, output_path: str, image_path: str = None,
+                        image_bytes: bytes = None) -> Tuple[bool, str]:
+        """
+        Sama seperti enhance, tetapi hasil di-decode langsung ke output_path
+        (lewat file sementara + rename, jadi tidak ada file setengah jadi)
         
-        # 4. Kirim POST request ke API Cerebrium
+        Returns:
+            Tuple[bool, str]: (True, output_path) atau (False, error_message)
+        """
+        tmp_path = f"{output_path}.part"
         try:
-            response = requests.post(
-                api_endpoint,
-                json=payload,
-                headers=headers,
-                timeout=120  # 120 detik timeout
-            )
-        except requests.exceptions.Timeout:
-            return False, "Request timeout - API tidak merespons dalam 120 detik"
-        except requests.exceptions.ConnectionError:
-            return False, f"Tidak dapat terhubung ke API endpoint: {api_endpoint}"
-        except Exception as e:
-            return False, f"Error saat mengirim request: {str(e)}"
-        
-        # 5. Periksa status code
-        if response.status_code != 200:
+            with open(tmp_path, "wb") as f:
+                success, result = self._request(task, f, image_path=image_path, image_bytes=image_bytes)
+            if not success:
+                os.remove(tmp_path)
+                return False, result
+            os.replace(tmp_path, output_path)
+            return True, output_path
+        except OSError as e:
+            return False, f"Error menyimpan hasil ke {output_path}: {str(e)}"
+    
+    def _request(self, task: str, sink, image_path: str = None, image_bytes: bytes = None,
+                 cancel: threading.Event = None) -> Tuple[bool, Union[int, str]]:
+        """POST ke endpoint predict dan decode gambar hasil ke sink; (True, size) atau (False, error)"""
+        api_endpoint = self.api_endpoint
+        try:
+            # 1-2. Payload JSON di-stream: gambar (dari memory atau file via mmap)
+            # di-encode base64 per chunk saat dikirim, bukan disalin utuh ke memory
             try:
-                error_detail = response.json()
-                return False, f"API error (status {response.status_code}): {error_detail}"
-            except:
-                return False, f"API error (status {response.status_code}): {response.text}"
+                if image_bytes is None:
+                    print(f"Membaca gambar dari: {image_path}")
+                payload = StreamingPayload(task, image_bytes=image_bytes, image_path=image_path)
+            except FileNotFoundError:
+                return False, f"File gambar tidak ditemukan: {image_path}"
+            except Exception as e:
+                return False, f"Error membaca file gambar: {str(e)}"
         
-        # 6. Parse respons JSON
-        try:
-            response_data = response.json()
-            print(f"🔍 Debug - Status Code: {response.status_code}")
-            print(f"🔍 Debug - Response data keys: {list(response_data.keys()) if isinstance(response_data, dict) else 'Not a dict'}")
-            print(f"🔍 Debug - Full Response: {response_data}")
-        except Exception as e:
-            print(f"🔍 Debug - Raw response text: {response.text}")
-            return False, f"Error parsing JSON response: {str(e)}"
+            print(f"Mengirim request ke API dengan task: {task}")
         
-        # 7. Ekstrak data gambar dari respons
-        # Cek format response Cerebrium: {'result': {...}, 'run_time_ms': ...}
-        if "result" in response_data:
-            result = response_data["result"]
-            
-            # Cek jika ada error di result
-            if isinstance(result, dict) and "error" in result:
-                return False, f"API error: {result['error']}"
-            
-            # Cek berbagai format result
-            if isinstance(result, dict) and "processed_image" in result:
-                processed_image_data = result["processed_image"]
-            elif isinstance(result, str):
-                processed_image_data = result
-            else:
-                return False, f"Format result tidak dikenali: {result}"
-        else:
-            return False, f"Response tidak mengandung 'result'. Response: {response_data}"
+            # 3. Kirim POST request ke API Cerebrium (Content-Length dari len(payload)).
+            # stream=True: body respons dibaca per chunk di langkah 5
+            try:
+                response = self.session.post(
+                    api_endpoint,
+                    data=payload,
+                    timeout=self.timeout,
+                    stream=True
+                )
+            except requests.exceptions.Timeout:
+                return False, APIError(f"Request timeout - API tidak merespons dalam {self.timeout} detik", retryable=True)
+            except requests.exceptions.ConnectionError:
+                return False, APIError(f"Tidak dapat terhubung ke API endpoint: {api_endpoint}", retryable=True)
+            except requests.exceptions.RequestException as e:
+                return False, APIError(f"Error saat mengirim request: {str(e)}", retryable=True)
+            except Exception as e:
+                return False, f"Error saat mengirim request: {str(e)}"
         
-        # 8. Ekstrak base64 string dari format "data:image/png;base64,..."
-        try:
-            if processed_image_data.startswith("data:image/"):
-                # Hapus prefix "data:image/png;base64," atau serupa
-                base64_string = processed_image_data.split(",", 1)[1]
-            else:
-                # Asumsikan sudah pure base64
-                base64_string = processed_image_data
-            
-            # Konversi base64 ke bytes
-            image_bytes = base64.b64decode(base64_string)
+            with response:
+                if cancel is not None and cancel.is_set():
+                    return False, APIError("Request dibatalkan")
+                
+                # 4. Periksa status code
+                if response.status_code != 200:
+                    try:
+                        error_detail = truncate(response.json())
+                    except Exception:
+                        error_detail = truncate(response.text)
+                    return False, APIError(
+                        f"API error (status {response.status_code}): {error_detail}",
+                        retryable=is_retryable_status(response.status_code),
+                        status=response.status_code,
+                        retry_after=_retry_after(response),
+                    )
             
-        except Exception as e:
-            return False, f"Error decoding base64 image: {str(e)}"
+                # 5-6. Parse respons secara incremental, base64 di-decode langsung ke sink
+                decoder = ResponseImageDecoder(sink)
+                try:
+                    for chunk in response.iter_content(chunk_size=RESPONSE_CHUNK_SIZE):
+                        if cancel is not None and cancel.is_set():
+                            return False, APIError("Request dibatalkan")
+                        decoder.feed(chunk)
+                except requests.exceptions.RequestException as e:
+                    return False, APIError(f"Error membaca response: {str(e)}", retryable=True)
+                except binascii.Error as e:
+                    return False, f"Error decoding base64 image: {str(e)}"
+                
+                logger.debug("Status Code: %s", response.status_code)
+                logger.debug("Response (awal): %s", truncate(decoder.head.decode("utf-8", "replace")))
+                success, result = decoder.close()
+                if not success:
+                    return False, result
         
-        print(f"Berhasil memproses gambar. Ukuran hasil: {len(image_bytes)} bytes")
-        return True, image_bytes
+            print(f"Berhasil memproses gambar. Ukuran hasil: {result} bytes")
+            return True, result
         
-    except Exception as e:
-        return False, f"Unexpected error: {str(e)}"
+        except Exception as e:
+            return False, f"Unexpected error: {str(e)}"
+
+
+# Client bersama per (endpoint, token), supaya semua caller memakai pool yang sama
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_endpoint: str, auth_token: str = None, pool_size: int = DEFAULT_POOL_SIZE) -> CerebriumClient:
+    """
+    Ambil CerebriumClient bersama untuk endpoint + token ini (dibuat saat pertama dipakai)
+    
+    Jika client sudah ada dengan pool lebih kecil dari pool_size, client diganti
+    dengan pool yang lebih besar.
+    """
+    key = (api_endpoint, auth_token)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None or client.pool_size < pool_size:
+            client = CerebriumClient(api_endpoint, auth_token, pool_size=pool_size)
+            _clients[key] = client
+        return client
+
+
+def enhance_image_cerebrium(image_path: str, task: str, api_endpoint: str, auth_token: str = None,
+                            image_bytes: bytes = None) -> Tuple[bool, Union[bytes, str]]:
+    """
+    Mengirim gambar lokal ke API Cerebrium untuk diproses dan mengembalikan hasil
+    Wrapper untuk CerebriumClient.enhance memakai client bersama (koneksi di-pool)
+    
+    Args:
+        image_path (str): Path lengkap menuju file gambar di komputer lokal
+        task (str): Tugas yang ingin dilakukan ("upscale", "face_restore", "full_enhance", "denoise", "crop_5r")
+        api_endpoint (str): URL lengkap ke endpoint predict Cerebrium
+        auth_token (str): Token Cerebrium (opsional)
+        image_bytes (bytes): Data gambar yang sudah ada di memory; jika diisi,
+            image_path tidak dibaca dari disk
+    
+    Returns:
+        Tuple[bool, Union[bytes, str]]: 
+            - (True, image_bytes) jika berhasil
+            - (False, error_message) jika gagal
+    """
+    return get_client(api_endpoint, auth_token).enhance(task, image_path=image_path, image_bytes=image_bytes)
 
 
 def save_processed_image(image_bytes: bytes, output_path: str) -> bool:
@@ -4,7 +4,9 @@ Menunjukkan berbagai skenario penggunaan
 """
 
 import os
+import asyncio
 from enhance_image_cerebrium import enhance_image_cerebrium, save_processed_image
+from enhance_async import enhance_many
 
 
 def process_single_image():
@@ -91,28 +93,32 @@ def batch_process_folder():
     
     print(f"Ditemukan {len(image_files)} file gambar")
     
-    # Proses setiap file
-    success_count = 0
-    for i, filename in enumerate(image_files, 1):
-        print(f"\n[{i}/{len(image_files)}] Memproses: {filename}")
-        
-        input_path = os.path.join(input_folder, filename)
-        
-        success, result = enhance_image_cerebrium(input_path, task, api_endpoint)
-        
-        if success:
-            # Buat nama file output
-            name, ext = os.path.splitext(filename)
-            output_filename = f"{name}_{task}{ext}"
-            output_path = os.path.join(output_folder, output_filename)
+    # Proses semua file dengan beberapa request berjalan bersamaan
+    async def run():
+        success_count = 0
+        jobs = ((os.path.join(input_folder, filename), task) for filename in image_files)
+        done = 0
+        async for (input_path, _), success, result in enhance_many(jobs, api_endpoint, concurrency=4):
+            done += 1
+            filename = os.path.basename(input_path)
+            print(f"\n[{done}/{len(image_files)}] Selesai: {filename}")
             
-            if save_processed_image(result, output_path):
-                print(f"✅ Berhasil: {output_filename}")
-                success_count += 1
+            if success:
+                # Buat nama file output
+                name, ext = os.path.splitext(filename)
+                output_filename = f"{name}_{task}{ext}"
+                output_path = os.path.join(output_folder, output_filename)
+                
+                if save_processed_image(result, output_path):
+                    print(f"✅ Berhasil: {output_filename}")
+                    success_count += 1
+                else:
+                    print(f"❌ Gagal menyimpan: {filename}")
             else:
-                print(f"❌ Gagal menyimpan: {filename}")
-        else:
-            print(f"❌ Gagal memproses: {filename} - {result}")
+                print(f"❌ Gagal memproses: {filename} - {result}")
+        return success_count
+    
+    success_count = asyncio.run(run())
     
     print(f"\n=== Selesai ===")
     print(f"Berhasil: {success_count}/{len(image_files)} file")
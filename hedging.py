@@ -0,0 +1,135 @@
+"""
+Hedged requests ke Cerebrium untuk memotong tail latency
+Jika request lebih lama dari persentil latency terbaru, duplikat dikirim;
+hasil pertama yang berhasil dipakai dan request yang kalah dibatalkan.
+Jumlah duplikat per menit dibatasi supaya biaya GPU tambahan terkendali.
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from config import HEDGE_PERCENTILE, HEDGE_MIN_SAMPLES, HEDGE_WINDOW, HEDGE_BUDGET_PER_MINUTE
+
+
+class LatencyTracker:
+    """
+    Latency request sukses terbaru per key, untuk threshold hedging adaptif
+
+    Key biasanya (task, tile): tile jauh lebih cepat dari foto utuh, jadi
+    keduanya dilacak terpisah supaya threshold tidak saling mencemari.
+    """
+
+    def __init__(self, window=HEDGE_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, percentile, min_samples=HEDGE_MIN_SAMPLES):
+        """
+        Returns:
+            float or None: Latency pada persentil ini, atau None jika sampel belum cukup
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < max(1, min_samples):
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+
+class HedgeBudget:
+    """Batas jumlah hedge per menit (sliding window 60 detik)"""
+
+    def __init__(self, per_minute=HEDGE_BUDGET_PER_MINUTE):
+        self.per_minute = per_minute
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """True (dan kurangi budget) jika hedge boleh dikirim sekarang"""
+        now = time.time()
+        with self._lock:
+            while self._sent and now - self._sent[0] >= 60:
+                self._sent.popleft()
+            if len(self._sent) >= self.per_minute:
+                return False
+            self._sent.append(now)
+            return True
+
+
+class HedgedClient:
+    """
+    Wrapper CerebriumClient dengan API enhance() yang sama
+
+    Request pertama dikirim biasa. Jika belum selesai setelah latency
+    persentil HEDGE_PERCENTILE (dari request sukses terbaru untuk task dan
+    jenis request yang sama: tile atau foto utuh) dan budget masih ada,
+    duplikat dikirim. Hasil sukses pertama menang;
+    request yang kalah di-cancel (koneksinya ditutup begitu respons datang,
+    body hasil yang besar tidak ikut di-download).
+    """
+
+    def __init__(self, client, percentile=HEDGE_PERCENTILE, tracker=None, budget=None):
+        self.client = client
+        self.percentile = percentile
+        self.tracker = tracker or LatencyTracker()
+        self.budget = budget or HedgeBudget()
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(2, client.pool_size * 2),
+                                            thread_name_prefix="hedge")
+
+    def enhance(self, task, image_path=None, image_bytes=None, tile=False):
+        key = (task, tile)
+        threshold = self.tracker.percentile(key, self.percentile)
+        cancels = [threading.Event()]
+        started = time.time()
+
+        def attempt(cancel):
+            return self.client.enhance(task, image_path=image_path, image_bytes=image_bytes, cancel=cancel)
+
+        primary = self._executor.submit(attempt, cancels[0])
+        pending = {primary}
+        if threshold is not None:
+            done, _ = wait(pending, timeout=threshold)
+            if not done and self.budget.take():
+                cancels.append(threading.Event())
+                hedge = self._executor.submit(attempt, cancels[1])
+                pending.add(hedge)
+                self.hedges_sent += 1
+                print(f"🪁 Hedging {task}{' tile' if tile else ''} request after {threshold:.1f}s (p{self.percentile:g})")
+
+        # Hasil sukses pertama menang; gagal hanya jika semua gagal
+        result = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                success, value = future.result()
+                if success:
+                    for cancel in cancels:
+                        cancel.set()
+                    if future is not primary:
+                        self.hedges_won += 1
+                    self.tracker.record(key, time.time() - started)
+                    return True, value
+                if result is None or future is primary:
+                    result = (success, value)
+        return result
+
+
+_hedged = {}
+_hedged_lock = threading.Lock()
+
+
+def get_hedged_client(client):
+    """HedgedClient bersama per CerebriumClient (latency history dan budget ikut dipakai bersama)"""
+    with _hedged_lock:
+        hedged = _hedged.get(id(client))
+        if hedged is None or hedged.client is not client:
+            hedged = _hedged[id(client)] = HedgedClient(client)
+        return hedged
@@ -0,0 +1,301 @@
+"""
+Durable job store (SQLite, WAL mode) untuk auto photo processing workflow
+Mencatat stage mana saja yang sudah selesai per foto, supaya setelah crash
+atau Ctrl+C job bisa dilanjutkan tanpa mengulang request ke Cerebrium
+"""
+
+import sqlite3
+import threading
+import time
+from config import JOB_DB
+
+
+# Status job
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    input_path TEXT NOT NULL,
+    content_hash TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    backup_path TEXT,
+    work_path TEXT,
+    enhanced_path TEXT,
+    enhance_name TEXT,
+    counter INTEGER,
+    upload_url TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    UNIQUE (input_path, content_hash)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS uploads (
+    remote_name TEXT PRIMARY KEY,
+    local_path TEXT NOT NULL,
+    job_id INTEGER,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    upload_url TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS uploads_due ON uploads (status, next_attempt);
+CREATE TABLE IF NOT EXISTS multipart_uploads (
+    remote_name TEXT PRIMARY KEY,
+    upload_id TEXT NOT NULL,
+    local_path TEXT,
+    size INTEGER NOT NULL,
+    part_size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS multipart_parts (
+    remote_name TEXT NOT NULL,
+    part_number INTEGER NOT NULL,
+    etag TEXT NOT NULL,
+    PRIMARY KEY (remote_name, part_number)
+);
+"""
+
+# Kolom checkpoint yang boleh di-update lewat JobStore.update
+_CHECKPOINT_FIELDS = (
+    "status", "backup_path", "work_path", "enhanced_path", "enhance_name",
+    "counter", "upload_url", "error",
+)
+
+
+class JobStore:
+    """
+    Tabel job yang di-key dengan (input_path, content_hash)
+
+    Satu koneksi dipakai bersama oleh semua worker pipeline, dilindungi lock.
+    """
+
+    def __init__(self, path=JOB_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def get_or_create(self, input_path, content_hash):
+        """
+        Ambil job untuk file ini, atau buat baru jika belum ada
+
+        Returns:
+            dict: Row job
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO jobs (input_path, content_hash, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (input_path, content_hash, now, now),
+            )
+            row = self._conn.execute(
+                "SELECT * FROM jobs WHERE input_path = ? AND content_hash = ?",
+                (input_path, content_hash),
+            ).fetchone()
+        return dict(row)
+
+    def update(self, job_id, **fields):
+        """Simpan checkpoint stage (mis. work_path, enhanced_path, upload_url)"""
+        unknown = set(fields) - set(_CHECKPOINT_FIELDS)
+        if unknown:
+            raise ValueError(f"Unknown job fields: {', '.join(sorted(unknown))}")
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id),
+            )
+
+    def mark_done(self, job_id, upload_url):
+        self.update(job_id, status=STATUS_DONE, upload_url=upload_url, error=None)
+
+    def mark_failed(self, job_id, error):
+        self.update(job_id, status=STATUS_FAILED, error=str(error))
+
+    def resumable_jobs(self):
+        """
+        Job yang belum selesai dan layak dilanjutkan setelah restart:
+        semua job pending, plus job gagal yang sudah punya enhanced file
+        (tinggal upload, tidak perlu request GPU lagi). Job yang upload-nya
+        sudah ada di retry queue dikirim oleh reconciler, bukan di-resume.
+
+        Returns:
+            list[dict]: Row job, urut dari yang paling lama
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM jobs WHERE (status = ? "
+                "OR (status = ? AND enhanced_path IS NOT NULL AND upload_url IS NULL)) "
+                "AND id NOT IN (SELECT job_id FROM uploads WHERE status = ? AND job_id IS NOT NULL) "
+                "ORDER BY id",
+                (STATUS_PENDING, STATUS_FAILED, STATUS_PENDING),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def record_file(self, path, size, mtime_ns, content_hash):
+        """Catat file input yang sudah punya job ke processed-file index"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) VALUES (?, ?, ?, ?)",
+                (path, size, mtime_ns, content_hash),
+            )
+
+    def file_index(self):
+        """
+        Processed-file index untuk catch-up scan
+
+        Returns:
+            dict: path → (size, mtime_ns)
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT path, size, mtime_ns FROM files").fetchall()
+        return {row["path"]: (row["size"], row["mtime_ns"]) for row in rows}
+
+    def queue_upload(self, remote_name, local_path, job_id=None, error=None, replace=True):
+        """
+        Masukkan upload yang gagal ke retry queue
+
+        Args:
+            replace (bool): False = abaikan jika remote_name sudah pernah di-queue
+                (termasuk yang sudah selesai), mis. saat import failed_uploads.txt
+
+        Returns:
+            bool: True jika entry ditambahkan / di-reset
+        """
+        now = time.time()
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            cursor = self._conn.execute(
+                f"{verb} INTO uploads (remote_name, local_path, job_id, next_attempt, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (remote_name, local_path, job_id, now, error, now, now),
+            )
+        return cursor.rowcount > 0
+
+    def due_uploads(self, limit):
+        """
+        Upload pending yang jadwal retry-nya sudah lewat
+
+        Returns:
+            list[dict]: Row upload, yang paling lama menunggu duluan
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT * FROM uploads WHERE status = ? AND next_attempt <= ? ORDER BY next_attempt LIMIT ?",
+                (STATUS_PENDING, time.time(), limit),
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def pending_uploads(self):
+        """Jumlah upload di retry queue yang belum selesai"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM uploads WHERE status = ?", (STATUS_PENDING,)
+            ).fetchone()[0]
+
+    def reschedule_upload(self, remote_name, delay, error):
+        """Catat attempt yang gagal dan jadwalkan retry berikutnya delay detik lagi"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET attempts = attempts + 1, next_attempt = ?, error = ?, updated_at = ? "
+                "WHERE remote_name = ?",
+                (now + delay, str(error), now, remote_name),
+            )
+
+    def retry_uploads_now(self):
+        """Jadwalkan semua upload pending untuk dikirim sekarang (mis. koneksi kembali)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET next_attempt = ? WHERE status = ?", (now, STATUS_PENDING)
+            )
+
+    def finish_upload(self, remote_name, status, upload_url=None, error=None):
+        """Keluarkan upload dari retry queue (STATUS_DONE atau STATUS_FAILED)"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE uploads SET status = ?, upload_url = ?, error = ?, updated_at = ? WHERE remote_name = ?",
+                (status, upload_url, error, time.time(), remote_name),
+            )
+
+    def start_multipart(self, remote_name, upload_id, local_path, size, part_size):
+        """Simpan UploadId multipart upload baru (menggantikan state lama untuk object ini)"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("DELETE FROM multipart_parts WHERE remote_name = ?", (remote_name,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO multipart_uploads "
+                "(remote_name, upload_id, local_path, size, part_size, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (remote_name, upload_id, local_path, size, part_size, now, now),
+            )
+
+    def get_multipart(self, remote_name):
+        """
+        Returns:
+            dict: Row multipart upload yang belum selesai, atau None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM multipart_uploads WHERE remote_name = ?", (remote_name,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def record_part(self, remote_name, part_number, etag):
+        """Catat part yang sudah diupload (ETag dari R2)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO multipart_parts (remote_name, part_number, etag) VALUES (?, ?, ?)",
+                (remote_name, part_number, etag),
+            )
+            self._conn.execute(
+                "UPDATE multipart_uploads SET updated_at = ? WHERE remote_name = ?",
+                (time.time(), remote_name),
+            )
+
+    def multipart_parts(self, remote_name):
+        """
+        Returns:
+            dict: part_number → ETag yang tercatat untuk object ini
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT part_number, etag FROM multipart_parts WHERE remote_name = ?", (remote_name,)
+            ).fetchall()
+        return {row["part_number"]: row["etag"] for row in rows}
+
+    def multipart_uploads(self):
+        """Semua multipart upload yang belum selesai / belum di-abort"""
+        with self._lock:
+            rows = self._conn.execute("SELECT * FROM multipart_uploads").fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_multipart(self, remote_name):
+        """Hapus state multipart setelah complete atau abort"""
+        with self._lock:
+            self._conn.execute("DELETE FROM multipart_parts WHERE remote_name = ?", (remote_name,))
+            self._conn.execute("DELETE FROM multipart_uploads WHERE remote_name = ?", (remote_name,))
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
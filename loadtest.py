@@ -0,0 +1,157 @@
+"""
+Load test untuk client Cerebrium
+Mengirim N request dengan concurrency tertentu dan melaporkan requests/s,
+latency p50/p95/p99 dan memory client. Tanpa --endpoint, mock_cerebrium
+dijalankan di proses yang sama (opsi mock ikut tersedia, lihat --help).
+
+Contoh:
+    python loadtest.py --image tes.jpg --requests 200 --concurrency 8 --latency uniform:0.2,0.8
+    python loadtest.py --endpoint http://127.0.0.1:8001/predict --mode async --concurrency 16
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from enhance_image_cerebrium import get_client
+from mock_cerebrium import add_arguments, make_server
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile dari list yang sudah di-sort"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, int(round(p / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[index]
+
+
+def _error_kind(error):
+    status = getattr(error, "status", None)
+    if status:
+        return f"HTTP {status}"
+    return str(error).split(":")[0][:60]
+
+
+def run_sync(endpoint, token, image, task, requests, concurrency):
+    """Request lewat CerebriumClient (pool koneksi bersama) di thread pool"""
+    client = get_client(endpoint, token, pool_size=concurrency)
+    results = []
+
+    def one(_):
+        started = time.perf_counter()
+        success, result = client.enhance(task, image_bytes=image)
+        results.append((time.perf_counter() - started, success, None if success else _error_kind(result)))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, range(requests)))
+    return results
+
+
+def run_async(endpoint, token, image, task, requests, concurrency):
+    """Request lewat enhance_async.enhance_many"""
+    from enhance_async import enhance_many
+
+    async def main():
+        results = []
+        started = {}
+
+        # Item diambil lazy oleh enhance_many, jadi waktu mulai dicatat saat request dikirim
+        async def items():
+            for i in range(requests):
+                started[i] = time.perf_counter()
+                yield _Item(image, task, i)
+
+        async for item, success, result in enhance_many(items(), endpoint, token, concurrency=concurrency):
+            results.append((time.perf_counter() - started[item.index], success,
+                            None if success else _error_kind(result)))
+        return results
+
+    return asyncio.run(main())
+
+
+class _Item(tuple):
+    """(image, task) yang juga membawa index request"""
+
+    def __new__(cls, image, task, index):
+        item = super().__new__(cls, (image, task))
+        item.index = index
+        return item
+
+
+def report(results, elapsed, peak_rss_kb, peak_heap):
+    latencies = sorted(latency for latency, success, _ in results if success)
+    errors = Counter(kind for _, success, kind in results if not success)
+    print("=" * 60)
+    print(f"📊 Requests: {len(results)} ({len(latencies)} ok, {len(results) - len(latencies)} failed) "
+          f"in {elapsed:.2f}s")
+    print(f"🚀 Throughput: {len(results) / elapsed:.2f} req/s")
+    if latencies:
+        print(f"⏱️ Latency p50 {percentile(latencies, 50):.3f}s | p95 {percentile(latencies, 95):.3f}s | "
+              f"p99 {percentile(latencies, 99):.3f}s | max {latencies[-1]:.3f}s")
+    for kind, count in errors.most_common():
+        print(f"❌ {kind}: {count}")
+    if peak_rss_kb:
+        print(f"💾 Peak RSS: {peak_rss_kb / 1024:.1f} MB")
+    if peak_heap:
+        print(f"💾 Peak Python heap (tracemalloc): {peak_heap / 1024 / 1024:.1f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test Cerebrium client against a (mock) endpoint")
+    parser.add_argument("--endpoint", help="predict URL; default: in-process mock server")
+    parser.add_argument("--auth-token", help="Cerebrium token for --endpoint")
+    parser.add_argument("--image", default="tes.jpg", help="image sent with every request")
+    parser.add_argument("--task", default="upscale")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--tracemalloc", action="store_true", help="track peak Python heap (slower)")
+    mock = parser.add_argument_group("mock server (without --endpoint)")
+    add_arguments(mock)
+    args = parser.parse_args()
+
+    endpoint, token = args.endpoint, args.auth_token
+    if endpoint is None:
+        args.port = 0
+        token = args.token
+        server = make_server(args)
+        threading.Thread(target=server.serve_forever, name="mock-cerebrium", daemon=True).start()
+        endpoint = server.url
+        print(f"🧪 In-process mock server: {endpoint} (RSS includes the server; run "
+              f"mock_cerebrium.py separately for client-only memory)")
+
+    with open(args.image, "rb") as f:
+        image = f.read()
+    print(f"🎯 {args.requests} x {args.task} ({len(image) / 1024:.0f} KB) → {endpoint}, "
+          f"concurrency {args.concurrency}, mode {args.mode}")
+
+    if args.tracemalloc:
+        tracemalloc.start()
+    run = run_sync if args.mode == "sync" else run_async
+    started = time.perf_counter()
+    # Log per request dari client tidak ditampilkan selama test
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = run(endpoint, token, image, args.task, args.requests, args.concurrency)
+    elapsed = time.perf_counter() - started
+
+    peak_heap = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    # ru_maxrss: KB di Linux, bytes di macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None
+    if peak_rss and sys.platform == "darwin":
+        peak_rss /= 1024
+    report(results, elapsed, peak_rss, peak_heap)
+
+
+if __name__ == "__main__":
+    main()
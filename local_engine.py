@@ -0,0 +1,168 @@
+"""
+Local CPU enhancement engine sebagai fallback saat Cerebrium tidak tersedia
+Kontrak sama dengan enhance_image_cerebrium: (success, image_bytes or error).
+Hasilnya lebih sederhana dari model GPU (Lanczos + unsharp, edge-aware denoise,
+crop 5R), tetapi foto tetap terkirim ke client dalam hitungan detik.
+
+Engine "onnx" (opsional) menjalankan model Real-ESRGAN ONNX di CPU untuk
+upscale; butuh `pip install onnxruntime numpy` dan LOCAL_ONNX_MODEL.
+"""
+
+import io
+import os
+import threading
+from PIL import Image, ImageFilter, ImageOps
+from config import (
+    TASK_RESOLUTION_LIMITS, LOCAL_ENGINE, LOCAL_MAX_OUTPUT_LONG_EDGE, LOCAL_ONNX_MODEL,
+    LOCAL_ONNX_TILE_SIZE, TILE_WORKERS
+)
+from utils import encode_jpeg
+from tiling import enhance_tiled, needs_tiling
+
+# onnxruntime opsional: tanpa onnxruntime, engine "onnx" memakai upscale Pillow
+try:
+    import numpy as np
+    import onnxruntime
+except ImportError:
+    np = None
+    onnxruntime = None
+
+# Rasio 5R (5x7 inch)
+RATIO_5R = 7 / 5
+
+
+def upscale(img, scale, max_long_edge=LOCAL_MAX_OUTPUT_LONG_EDGE):
+    """Lanczos upscale + unsharp mask; output dibatasi max_long_edge"""
+    factor = min(scale, max_long_edge / max(img.size))
+    if factor > 1:
+        size = (round(img.width * factor), round(img.height * factor))
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    return img.filter(ImageFilter.UnsharpMask(radius=2, percent=80, threshold=2))
+
+
+def denoise(img):
+    """
+    Denoise cepat yang menjaga edge (mirip bilateral): area datar diambil dari
+    versi blur, area dengan edge tetap dari image asli
+    """
+    smooth = img.filter(ImageFilter.MedianFilter(3)).filter(ImageFilter.GaussianBlur(1.5))
+    edges = img.convert("L").filter(ImageFilter.FIND_EDGES)
+    mask = edges.filter(ImageFilter.MaxFilter(3)).filter(ImageFilter.GaussianBlur(2))
+    mask = mask.point(lambda v: min(255, v * 4))
+    return Image.composite(img, smooth, mask)
+
+
+def crop_5r(img):
+    """Center crop ke rasio 5R (7:5 landscape atau 5:7 portrait)"""
+    ratio = RATIO_5R if img.width >= img.height else 1 / RATIO_5R
+    if img.width / img.height > ratio:
+        size = (round(img.height * ratio), img.height)
+    else:
+        size = (img.width, round(img.width / ratio))
+    return ImageOps.fit(img, size, Image.Resampling.LANCZOS)
+
+
+def _sharpen(img):
+    return img.filter(ImageFilter.UnsharpMask(radius=1.5, percent=60, threshold=3))
+
+
+class PillowEngine:
+    """Engine CPU berbasis Pillow, tanpa dependency tambahan"""
+
+    name = "pillow"
+
+    def upscale(self, img, scale):
+        return upscale(img, scale)
+
+    def enhance(self, task, image_bytes):
+        """
+        Args:
+            task (str): AI task ("upscale", "denoise", "crop_5r", "face_restore", "full_enhance")
+            image_bytes (bytes): JPEG payload
+
+        Returns:
+            tuple: (success: bool, JPEG bytes or error_message: str)
+        """
+        try:
+            img = Image.open(io.BytesIO(image_bytes))
+            img = img.convert("RGB")
+            scale = TASK_RESOLUTION_LIMITS.get(task, {}).get("scale", 1)
+            if task == "upscale":
+                img = self.upscale(img, scale)
+            elif task == "denoise":
+                img = denoise(img)
+            elif task == "crop_5r":
+                img = _sharpen(crop_5r(img))
+            elif task == "face_restore":
+                # Tidak ada face restoration di CPU: denoise + sharpen ringan
+                img = _sharpen(denoise(img))
+            elif task == "full_enhance":
+                img = self.upscale(denoise(img), scale)
+            else:
+                return False, f"Local engine does not support task: {task}"
+            return True, encode_jpeg(img)
+        except Exception as e:
+            return False, f"Local enhancement failed: {str(e)}"
+
+
+class OnnxEngine(PillowEngine):
+    """
+    Upscale dengan model Real-ESRGAN ONNX di CPU (per tile, lewat tiling.py);
+    task lain sama dengan PillowEngine
+    """
+
+    name = "onnx"
+
+    def __init__(self, model_path=LOCAL_ONNX_MODEL, tile_size=LOCAL_ONNX_TILE_SIZE):
+        self.session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.tile_size = tile_size
+
+    def _run_tile(self, tile_bytes):
+        tile = Image.open(io.BytesIO(tile_bytes)).convert("RGB")
+        x = np.asarray(tile, dtype=np.float32).transpose(2, 0, 1)[None] / 255.0
+        y = self.session.run(None, {self.input_name: x})[0][0]
+        out = (np.clip(y, 0, 1).transpose(1, 2, 0) * 255.0).round().astype(np.uint8)
+        return True, encode_jpeg(Image.fromarray(out))
+
+    def upscale(self, img, scale):
+        payload = encode_jpeg(img)
+        if needs_tiling(img.size, self.tile_size):
+            success, result = enhance_tiled(payload, self._run_tile, self.tile_size, 16, TILE_WORKERS)
+        else:
+            success, result = self._run_tile(payload)
+        if not success:
+            raise RuntimeError(result)
+        img = Image.open(io.BytesIO(result))
+        if max(img.size) > LOCAL_MAX_OUTPUT_LONG_EDGE:
+            img = ImageOps.contain(img, (LOCAL_MAX_OUTPUT_LONG_EDGE, LOCAL_MAX_OUTPUT_LONG_EDGE),
+                                   Image.Resampling.LANCZOS)
+        return img
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine(name=LOCAL_ENGINE):
+    """Engine lokal sesuai LOCAL_ENGINE; "onnx" turun ke Pillow jika model/onnxruntime tidak ada"""
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            if name == "onnx" and onnxruntime is not None and LOCAL_ONNX_MODEL and os.path.exists(LOCAL_ONNX_MODEL):
+                _engine = OnnxEngine()
+            else:
+                if name == "onnx":
+                    print("⚠️ ONNX engine unavailable (onnxruntime or LOCAL_ONNX_MODEL missing), using Pillow")
+                _engine = PillowEngine()
+        return _engine
+
+
+def enhance_local(image_bytes, task):
+    """
+    Enhance di CPU lokal, kontrak sama dengan enhance_image_cerebrium
+
+    Returns:
+        tuple: (success: bool, JPEG bytes or error_message: str)
+    """
+    return get_engine().enhance(task, image_bytes)
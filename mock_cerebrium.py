@@ -0,0 +1,226 @@
+"""
+Mock server Cerebrium (/predict) untuk development dan load test tanpa biaya GPU
+Mendukung distribusi latency, cold start, injeksi 429/5xx/timeout dan berbagai
+bentuk respons (dict, data URL, string, error, JSON rusak).
+
+Contoh:
+    python mock_cerebrium.py --port 8001 --latency lognormal:0.0,0.4 \\
+        --cold-start 15 --idle-timeout 60 --error-rate 0.05 --shape mixed
+"""
+
+import argparse
+import base64
+import io
+import json
+import math
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SHAPES = ("dict", "string", "plain", "error", "malformed")
+
+
+def parse_latency(spec):
+    """
+    Distribusi latency dari string spec
+
+    Args:
+        spec (str): "fixed:S", "uniform:A,B", "normal:MEAN,SD" atau
+            "lognormal:MU,SIGMA" (detik; lognormal → exp(N(mu, sigma)))
+
+    Returns:
+        callable: Fungsi tanpa argumen yang mengembalikan latency (detik)
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "normal":
+        return lambda: max(0.0, random.gauss(values[0], values[1]))
+    if kind == "lognormal":
+        return lambda: math.exp(random.gauss(values[0], values[1]))
+    raise ValueError(f"Unknown latency distribution: {spec}")
+
+
+class MockState:
+    """State bersama semua request: cold start, replica, statistik"""
+
+    def __init__(self, args):
+        self.args = args
+        self.latency = parse_latency(args.latency)
+        self.replicas = threading.Semaphore(args.replicas) if args.replicas else None
+        self.lock = threading.Lock()
+        self.last_request = 0.0
+        self.warm_until = 0.0  # cold start selesai pada waktu ini
+        self.stats = {"requests": 0, "cold_starts": 0, "errors": 0, "timeouts": 0}
+
+    def cold_start_delay(self):
+        """Sisa waktu cold start untuk request ini (0 jika container sudah hangat)"""
+        now = time.time()
+        with self.lock:
+            self.stats["requests"] += 1
+            idle = self.last_request and now - self.last_request > self.args.idle_timeout
+            if self.args.cold_start and (not self.last_request or idle) and now >= self.warm_until:
+                self.warm_until = now + self.args.cold_start
+                self.stats["cold_starts"] += 1
+            self.last_request = now
+            return max(0.0, self.warm_until - now)
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state = None
+
+    def log_message(self, format, *args):
+        if self.state.args.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, body, headers=None):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_body(self):
+        length = self.headers.get("Content-Length")
+        if length is not None:
+            return self.rfile.read(int(length))
+        chunks = []
+        while True:
+            size = int(self.rfile.readline().strip(), 16)
+            if size == 0:
+                self.rfile.readline()
+                return b"".join(chunks)
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/stats":
+            with self.state.lock:
+                self._send_json(200, dict(self.state.stats))
+        else:
+            self._send_json(404, {"detail": "Not found"})
+
+    def do_POST(self):
+        args = self.state.args
+        body = self._read_body()
+        if args.token and self.headers.get("Authorization") != f"Bearer {args.token}":
+            self._send_json(401, {"detail": "Unauthorized"})
+            return
+        try:
+            item = json.loads(body)["item"]
+            image = base64.b64decode(item["image_base64"])
+        except Exception as e:
+            self._send_json(422, {"detail": f"Invalid payload: {e}"})
+            return
+
+        # Cold start dan antrian replica terjadi sebelum inference
+        time.sleep(self.state.cold_start_delay())
+        if self.state.replicas is not None:
+            self.state.replicas.acquire()
+        try:
+            roll = random.random()
+            if roll < args.timeout_rate:
+                self.state.count("timeouts")
+                time.sleep(args.hang)
+            time.sleep(self.state.latency())
+            if roll >= args.timeout_rate and roll < args.timeout_rate + args.error_rate:
+                self.state.count("errors")
+                status = random.choice(args.error_status)
+                headers = {"Retry-After": "1"} if status in (429, 503) else None
+                self._send_json(status, {"detail": "Injected error"}, headers)
+                return
+            self._send_result(item.get("task"), image)
+        finally:
+            if self.state.replicas is not None:
+                self.state.replicas.release()
+
+    def _send_result(self, task, image):
+        args = self.state.args
+        if args.output_scale > 1:
+            image = _upscale(image, args.output_scale)
+        encoded = base64.b64encode(image).decode("ascii")
+        shape = random.choice(SHAPES[:3]) if args.shape == "mixed" else args.shape
+        if shape == "dict":
+            body = {"run_id": "mock", "result": {"processed_image": f"data:image/png;base64,{encoded}"},
+                    "run_time_ms": 0}
+        elif shape == "plain":
+            body = {"result": {"processed_image": encoded}}
+        elif shape == "string":
+            body = {"result": encoded}
+        elif shape == "error":
+            body = {"result": {"error": f"Mock error for task {task}"}}
+        else:
+            data = json.dumps({"result": {"processed_image": encoded}}).encode("utf-8")
+            self._send_json(200, data[:len(data) // 2])
+            return
+        self._send_json(200, body)
+
+
+def _upscale(image, scale):
+    """Simulasikan ukuran output model (mis. 4x) dengan resize cepat"""
+    from PIL import Image
+    img = Image.open(io.BytesIO(image))
+    img = img.resize((img.width * scale, img.height * scale), Image.Resampling.NEAREST)
+    buffer = io.BytesIO()
+    img.convert("RGB").save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def add_arguments(parser):
+    """Opsi mock server (dipakai juga oleh loadtest.py)"""
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", default="fixed:0.5",
+                        help="fixed:S | uniform:A,B | normal:MEAN,SD | lognormal:MU,SIGMA (seconds)")
+    parser.add_argument("--cold-start", type=float, default=0.0, help="cold start duration (seconds)")
+    parser.add_argument("--idle-timeout", type=float, default=300.0, help="idle seconds before the next cold start")
+    parser.add_argument("--replicas", type=int, default=0, help="max concurrent inferences (0 = unlimited)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with --error-status")
+    parser.add_argument("--error-status", type=lambda s: [int(v) for v in s.split(",")], default=[429, 500, 503])
+    parser.add_argument("--timeout-rate", type=float, default=0.0, help="fraction of requests that hang for --hang seconds")
+    parser.add_argument("--hang", type=float, default=150.0)
+    parser.add_argument("--shape", choices=SHAPES + ("mixed",), default="dict", help="response shape")
+    parser.add_argument("--output-scale", type=int, default=1, help="resize output (e.g. 4 for upscale)")
+    parser.add_argument("--token", help="require this Bearer token")
+    parser.add_argument("--verbose", action="store_true")
+    return parser
+
+
+def make_server(args):
+    """
+    Returns:
+        ThreadingHTTPServer: Server (belum berjalan); URL predict ada di server.url
+    """
+    handler = type("Handler", (MockHandler,), {"state": MockState(args)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    server.daemon_threads = True
+    server.state = handler.state
+    server.url = f"http://{args.host}:{server.server_port}/predict"
+    return server
+
+
+def main():
+    parser = add_arguments(argparse.ArgumentParser(description="Mock Cerebrium /predict server"))
+    args = parser.parse_args()
+    server = make_server(args)
+    print(f"🧪 Mock Cerebrium listening on {server.url} (stats: /stats)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n📊 {server.state.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""
+Staged concurrent pipeline untuk auto photo processing workflow
+Setiap stage punya queue terbatas dan worker sendiri, sehingga foto N+1
+bisa di-decode/watermark selagi foto N di Cerebrium dan foto N-1 di-upload.
+Stage upload memakai uploader.UploadPool yang queue-nya tidak terbatas,
+sehingga uplink yang lambat tidak menahan stage enhance.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import wait
+from config import (
+    PIPELINE_PREPARE_WORKERS, PIPELINE_ENHANCE_WORKERS, PIPELINE_UPLOAD_WORKERS,
+    PIPELINE_QUEUE_SIZE
+)
+from utils import save_counter, log_error, wait_until_complete, file_hash
+from processor import (
+    prepare_photo, enhance_with_cerebrium, enhanced_file_name, save_enhanced_image_async, upload_enhanced
+)
+from uploader import UploadPool
+from jobstore import STATUS_DONE, STATUS_PENDING
+
+
+# Sentinel untuk menghentikan worker
+_STOP = object()
+
+
+class PhotoJob:
+    """State satu foto selama melewati pipeline"""
+
+    def __init__(self, input_path, complete=False):
+        self.input_path = input_path
+        self.fname = os.path.basename(input_path)
+        self.complete = complete
+        self.job_id = None
+        self.content_hash = None
+        self.backup_path = None
+        self.payload = None
+        self.work_path = None
+        self.enhanced_path = None
+        self.enhance_name = None
+        self.enhanced_bytes = None
+        self.save_future = None
+        self.upload = None
+        self.counter = None
+        self.upload_url = None
+
+    @classmethod
+    def from_row(cls, row):
+        """Buat job dari row JobStore (untuk resume)"""
+        job = cls(row["input_path"])
+        job.load_row(row)
+        return job
+
+    def load_row(self, row):
+        """Ambil id dan semua checkpoint dari row JobStore"""
+        self.job_id = row["id"]
+        self.content_hash = row["content_hash"]
+        for name in ("backup_path", "work_path", "enhanced_path", "enhance_name", "counter", "upload_url"):
+            setattr(self, name, row[name])
+
+    def has_checkpoint(self, name):
+        """True jika checkpoint path ada di store dan file-nya masih ada di disk"""
+        path = getattr(self, name)
+        return path is not None and os.path.exists(path)
+
+    def resume_stage(self):
+        """
+        Stage pertama yang belum punya checkpoint
+
+        Returns:
+            str: "upload", "enhance", "prepare", atau None jika input sudah hilang
+        """
+        if self.has_checkpoint("enhanced_path"):
+            return "upload"
+        if self.payload is not None or self.has_checkpoint("work_path"):
+            return "enhance"
+        if os.path.exists(self.input_path):
+            return "prepare"
+        return None
+
+
+class Stage:
+    """
+    Satu stage pipeline: bounded queue + sekumpulan worker thread
+
+    Handler menerima PhotoJob dan mengembalikan True jika job boleh
+    diteruskan ke stage berikutnya. on_done dipanggil saat job keluar dari
+    pipeline (selesai, di-skip, atau error).
+    """
+
+    def __init__(self, name, handler, workers, maxsize, on_error, on_done):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.next_stage = None
+        self.on_error = on_error
+        self.on_done = on_done
+        self._threads = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"{self.name}-{i + 1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def put(self, job):
+        """Masukkan job ke queue (blocking jika queue penuh / backpressure)"""
+        self.queue.put(job)
+
+    def stop(self):
+        """Tunggu semua job di queue selesai lalu hentikan worker"""
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is _STOP:
+                break
+            try:
+                if self.handler(job) and self.next_stage is not None:
+                    self.next_stage.put(job)
+                    continue
+            except Exception as e:
+                self.on_error(job, e)
+            self.on_done(job)
+
+
+class UploadStage:
+    """
+    Stage terakhir: job diserahkan ke UploadPool dan put() langsung kembali
+
+    Handler men-submit upload dan memasang callback yang menyelesaikan job
+    (checkpoint + on_done) dari worker upload.
+    """
+
+    name = "upload"
+
+    def __init__(self, handler, workers, store=None):
+        self.handler = handler
+        self.pool = UploadPool(workers, store=store)
+        self.workers = self.pool.workers
+
+    def start(self):
+        self.pool.start()
+
+    def put(self, job):
+        self.handler(job)
+
+    def stop(self):
+        """Tunggu semua upload (termasuk retry) selesai"""
+        self.pool.stop()
+
+
+class PhotoPipeline:
+    """
+    Pipeline prepare → enhance → upload dengan concurrency per stage
+
+    Setiap stage menyimpan checkpoint ke JobStore. Stage yang checkpoint-nya
+    sudah ada di-skip, sehingga job hasil resume langsung lanjut dari stage
+    terakhir yang selesai (mis. langsung upload tanpa request GPU lagi).
+
+    Counter untuk naming diambil setelah enhancement berhasil, sehingga nomor
+    hanya dipakai oleh foto yang berhasil di-enhance (sama seperti process_photo).
+
+    Jika reconciler diisi, upload yang tetap gagal masuk retry queue dan
+    dikirim ulang oleh reconciler.UploadReconciler di background.
+    """
+
+    def __init__(self, counter, store,
+                 prepare_workers=PIPELINE_PREPARE_WORKERS,
+                 enhance_workers=PIPELINE_ENHANCE_WORKERS,
+                 upload_workers=PIPELINE_UPLOAD_WORKERS,
+                 queue_size=PIPELINE_QUEUE_SIZE,
+                 reconciler=None):
+        self.counter = counter
+        self.store = store
+        self.reconciler = reconciler
+        self._counter_lock = threading.Lock()
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+
+        self.queue_size = queue_size
+
+        self.stages = [
+            Stage(name, handler, workers, queue_size, self._on_error, self._on_done)
+            for name, handler, workers in (
+                ("prepare", self._prepare, prepare_workers),
+                ("enhance", self._enhance, enhance_workers),
+            )
+        ]
+        self.stages.append(UploadStage(self._upload, upload_workers, store))
+        self.uploads = self.stages[-1].pool
+        for stage, next_stage in zip(self.stages, self.stages[1:]):
+            stage.next_stage = next_stage
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+        print(f"⚙️ Pipeline started: " + ", ".join(f"{s.name}={s.workers}" for s in self.stages))
+
+    def submit(self, input_path, complete=False):
+        """
+        Masukkan foto baru ke pipeline
+
+        Args:
+            input_path (str): Path ke file input
+            complete (bool): True jika file sudah pasti selesai ditulis
+                (close/rename event), sehingga stage prepare tidak perlu polling
+
+        Returns:
+            bool: False jika file yang sama sudah sedang diproses
+        """
+        return self._enqueue(PhotoJob(input_path, complete))
+
+    def _enqueue(self, job):
+        with self._inflight_lock:
+            if job.input_path in self._inflight:
+                return False
+            self._inflight.add(job.input_path)
+        self.stages[0].put(job)
+        return True
+
+    def _on_done(self, job):
+        with self._inflight_lock:
+            self._inflight.discard(job.input_path)
+
+    def resume_pending(self):
+        """
+        Masukkan kembali job yang belum selesai dari JobStore
+
+        Returns:
+            int: Jumlah job yang di-resume
+        """
+        resumed = 0
+        for row in self.store.resumable_jobs():
+            job = PhotoJob.from_row(row)
+            stage = job.resume_stage()
+            if stage is None:
+                self.store.mark_failed(job.job_id, "Input file no longer exists")
+                continue
+            self.store.update(job.job_id, status=STATUS_PENDING)
+            if self._enqueue(job):
+                print(f"♻️ Resuming {job.fname} at {stage}")
+                resumed += 1
+        return resumed
+
+    def stop(self):
+        """Selesaikan foto yang sudah ada di pipeline lalu hentikan semua worker"""
+        for stage in self.stages:
+            stage.stop()
+
+    def _next_counter(self):
+        with self._counter_lock:
+            counter = self.counter
+            self.counter += 1
+            save_counter(self.counter)
+            return counter
+
+    def _prepare(self, job):
+        if job.resume_stage() in ("enhance", "upload"):
+            return True
+
+        # Wait until file transfer complete, lalu register job di store
+        if not job.complete:
+            wait_until_complete(job.input_path)
+        if job.job_id is None:
+            stat = os.stat(job.input_path)
+            job.content_hash = file_hash(job.input_path)
+            row = self.store.get_or_create(job.input_path, job.content_hash)
+            self.store.record_file(job.input_path, stat.st_size, stat.st_mtime_ns, job.content_hash)
+            if row["status"] == STATUS_DONE:
+                print(f"⏭️ Already processed: {job.fname} → {row['upload_url']}")
+                return False
+            job.load_row(row)
+            if row["status"] != STATUS_PENDING:
+                self.store.update(job.job_id, status=STATUS_PENDING, error=None)
+            if job.resume_stage() in ("enhance", "upload"):
+                return True
+
+        prepared = prepare_photo(job.input_path)
+        if prepared is None:
+            self.store.mark_failed(job.job_id, "Unable to decode input")
+            return False
+        job.backup_path, job.payload, job.work_path = prepared
+        self.store.update(job.job_id, backup_path=job.backup_path, work_path=job.work_path)
+        return True
+
+    def _enhance(self, job):
+        if job.has_checkpoint("enhanced_path"):
+            return True
+
+        # Job hasil resume: payload hanya ada di disk jika SAVE_WORK_FILES aktif
+        if job.payload is None:
+            with open(job.work_path, "rb") as f:
+                job.payload = f.read()
+
+        success, result = enhance_with_cerebrium(job.payload, job.fname)
+        if not success:
+            raise RuntimeError(f"Enhancement failed: {result}")
+        job.payload = None
+
+        # Job hasil resume yang sudah punya nomor tetap memakai nomor yang sama
+        if job.counter is None:
+            job.counter = self._next_counter()
+        self.store.update(job.job_id, counter=job.counter)
+
+        # Hasil ditulis ke disk di background selagi stage upload memakai bytes di
+        # memory; checkpoint enhanced_path baru disimpan setelah file lengkap
+        job.enhanced_bytes = result
+        job.enhance_name = enhanced_file_name(job.counter)[1]
+        job.save_future = save_enhanced_image_async(result, job.counter)
+        job.save_future.add_done_callback(lambda future: self._saved(job, future))
+        return True
+
+    def _saved(self, job, future):
+        error = future.exception()
+        if error is not None:
+            print(f"⚠️ Could not save local copy of {job.fname}: {error}")
+            log_error(job.fname, f"Local save failed: {error}")
+            return
+        job.enhanced_path, job.enhance_name = future.result()
+        self.store.update(job.job_id, enhanced_path=job.enhanced_path, enhance_name=job.enhance_name)
+
+        # Upload tertahan di queue (uplink lambat): lepas bytes di memory,
+        # upload nanti membaca salinan lokal
+        upload = job.upload
+        if upload is not None and self.uploads.backlog() > self.queue_size:
+            upload.release()
+
+    def _upload(self, job):
+        # Upload langsung dari memory; job hasil resume diupload dari file
+        enhanced_path = job.enhanced_path or enhanced_file_name(job.counter)[0]
+        job.upload = upload_enhanced(enhanced_path, job.enhance_name, job.enhanced_bytes, self.uploads)
+        job.enhanced_bytes = None
+        job.upload.future.add_done_callback(lambda future: self._uploaded(job, future))
+
+    def _uploaded(self, job, future):
+        # Dipanggil dari worker upload setelah upload selesai atau semua retry gagal
+        try:
+            # Salinan lokal harus selesai sebelum job keluar dari pipeline. Checkpoint
+            # diambil langsung dari future karena callback _saved bisa belum jalan
+            if job.save_future is not None:
+                wait([job.save_future])
+                if job.save_future.exception() is None:
+                    job.enhanced_path, job.enhance_name = job.save_future.result()
+                    self.store.update(job.job_id, enhanced_path=job.enhanced_path,
+                                      enhance_name=job.enhance_name)
+            upload_success, result = future.result()
+            if not upload_success:
+                self.store.mark_failed(job.job_id, f"Upload failed: {result}")
+                if self.reconciler is not None and job.has_checkpoint("enhanced_path"):
+                    self.store.queue_upload(job.enhance_name, job.enhanced_path, job.job_id, result)
+                    self.reconciler.notify()
+                return
+            job.upload_url = result
+            self.store.mark_done(job.job_id, job.upload_url)
+            print(f"✅ Photo processed successfully: {job.fname} → #{job.counter}")
+        except Exception as e:
+            self._on_error(job, e)
+        finally:
+            job.upload = None
+            self._on_done(job)
+
+    def _on_error(self, job, error):
+        print(f"❌ Error memproses {job.fname}: {error}")
+        log_error(job.fname, str(error))
+        if job.job_id is not None:
+            self.store.mark_failed(job.job_id, error)
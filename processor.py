@@ -2,17 +2,29 @@
 Photo processing logic
 """
 
+import io
 import os
-import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 from config import (
     RAW_BACKUP_DIR, JPG_BACKUP_DIR, WORK_DIR, ENHANCED_DIR,
-    ENABLE_WATERMARK, CEREBRIUM_API, CEREBRIUM_AUTH_TOKEN, ENHANCEMENT_TASK, OUTPUT_PREFIX,
-    TASK_OPTIONS, ACTIVE_TASK_TYPE
+    ENABLE_WATERMARK, ENHANCEMENT_TASK, OUTPUT_PREFIX,
+    TASK_OPTIONS, ACTIVE_TASK_TYPE, TASK_RESOLUTION_LIMITS, TASK_TILING, TILE_WORKERS,
+    SAVE_WORK_FILES, CEREBRIUM_ENDPOINT_VERSION, ENABLE_RESULT_CACHE,
+    ENABLE_HEDGING, ENABLE_LOCAL_FALLBACK, ENABLE_UPLOAD_RECONCILER
 )
-from utils import wait_until_complete, safe_open_image, add_watermark, log_error
-from uploader import upload_to_r2
-from enhance_image_cerebrium import enhance_image_cerebrium
+from utils import (
+    wait_until_complete, safe_open_image, add_watermark, encode_jpeg, copy_file_fast, log_error
+)
+from uploader import get_upload_pool
+from tiling import enhance_tiled, needs_tiling
+from result_cache import get_cache, cache_key
+from resilience import call_with_retry, get_breaker
+from hedging import get_hedged_client
+from routing import get_router
+from local_engine import enhance_local
+from enhance_image_cerebrium import is_retryable
 
 
 def process_raw_file(input_path, base_name):
@@ -30,8 +42,8 @@ def process_raw_file(input_path, base_name):
     
     # Backup RAW file (copy original)
     raw_backup_path = os.path.join(RAW_BACKUP_DIR, os.path.basename(input_path))
-    shutil.copy2(input_path, raw_backup_path)
-    print(f"📂 RAW Backup → {raw_backup_path}")
+    method = copy_file_fast(input_path, raw_backup_path)
+    print(f"📂 RAW Backup → {raw_backup_path} ({method})")
     
     # Convert RAW to JPG for processing (requires rawpy)
     try:
@@ -63,6 +75,23 @@ def process_regular_image(input_path):
     return safe_open_image(input_path)
 
 
+def backup_original_jpg(input_path, base_name):
+    """
+    Backup input JPEG apa adanya (byte-for-byte, tanpa decode/re-encode)
+    
+    Args:
+        input_path (str): Path ke file JPEG input
+        base_name (str): Base name untuk file
+    
+    Returns:
+        str: Path ke backup file
+    """
+    jpg_backup_path = os.path.join(JPG_BACKUP_DIR, base_name + ".jpg")
+    method = copy_file_fast(input_path, jpg_backup_path)
+    print(f"📂 JPG Backup → {jpg_backup_path} ({method})")
+    return jpg_backup_path
+
+
 def backup_jpg(img, base_name):
     """
     Backup processed JPG
@@ -72,51 +101,108 @@ def backup_jpg(img, base_name):
         base_name (str): Base name untuk file
     
     Returns:
-        str: Path ke backup file
+        tuple: (backup_path: str, jpeg_bytes: bytes) - bytes bisa dipakai ulang
+            sebagai payload API jika parameternya sama
     """
     jpg_backup_path = os.path.join(JPG_BACKUP_DIR, base_name + ".jpg")
-    img.convert("RGB").save(jpg_backup_path, "JPEG", quality=95)
+    jpeg_bytes = encode_jpeg(img)
+    with open(jpg_backup_path, "wb") as f:
+        f.write(jpeg_bytes)
     print(f"📂 JPG Backup → {jpg_backup_path}")
-    return jpg_backup_path
+    return jpg_backup_path, jpeg_bytes
+
+
+def get_current_task():
+    """AI task untuk ACTIVE_TASK_TYPE"""
+    return TASK_OPTIONS.get(ACTIVE_TASK_TYPE, ENHANCEMENT_TASK)
+
+
+def limit_resolution(img, task):
+    """
+    Downscale image ke input terkecil yang masih mencapai target output task
+    (lihat TASK_RESOLUTION_LIMITS), supaya payload, waktu GPU dan ukuran
+    response tidak membengkak untuk hasil yang tidak terpakai
+    
+    Args:
+        img (PIL.Image): Image to resize
+        task (str): AI task
+    
+    Returns:
+        PIL.Image: Image yang sudah di-resize, atau img asli jika sudah cukup kecil
+    """
+    limits = TASK_RESOLUTION_LIMITS.get(task)
+    if not limits:
+        return img
+    
+    width, height = img.size
+    scale = limits.get("scale", 1)
+    factor = 1.0
+    if limits.get("max_output_long_edge"):
+        factor = min(factor, limits["max_output_long_edge"] / (scale * max(width, height)))
+    if limits.get("max_input_mp"):
+        factor = min(factor, (limits["max_input_mp"] * 1_000_000 / (width * height)) ** 0.5)
+    if factor >= 1.0:
+        return img
+    
+    new_size = (max(1, round(width * factor)), max(1, round(height * factor)))
+    print(f"📐 Resize for {task}: {width}x{height} → {new_size[0]}x{new_size[1]} "
+          f"(output ~{new_size[0] * scale}x{new_size[1] * scale})")
+    return img.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=3.0)
 
 
-def prepare_for_api(img, base_name):
+def prepare_for_api(img, base_name, encoded=None):
     """
-    Prepare image untuk dikirim ke API (add watermark, save)
+    Prepare image untuk dikirim ke API (batasi resolusi, add watermark, encode di memory)
     
     Args:
-        img (PIL.Image): Image to process
+        img (PIL.Image): Image to process (di-watermark in place)
         base_name (str): Base name untuk file
+        encoded (bytes): JPEG bytes dari img apa adanya (mis. dari backup_jpg),
+            dipakai ulang jika tidak ada watermark sehingga tidak encode dua kali
     
     Returns:
-        str: Path ke file yang siap dikirim ke API
+        tuple: (payload: bytes, work_path: str or None jika SAVE_WORK_FILES off)
     """
-    # Add watermark if enabled
+    # Batasi resolusi sesuai task
+    resized = limit_resolution(img, get_current_task())
+    if resized is not img:
+        img = resized
+        encoded = None
+    
+    # Add watermark if enabled (langsung ke img, img tidak dipakai lagi setelah ini)
     if ENABLE_WATERMARK:
-        img = add_watermark(img)
+        img = add_watermark(img, in_place=True)
+        encoded = None
     
-    # Save final processed image for API
-    work_path = os.path.join(WORK_DIR, f"{base_name}_processed.jpg")
-    img.convert("RGB").save(work_path, "JPEG", quality=95)
-    print(f"🛠️ Processed image ready → {work_path}")
+    payload = encoded if encoded is not None else encode_jpeg(img)
     
-    return work_path
+    # Debug output: simpan payload ke WORK_DIR
+    work_path = None
+    if SAVE_WORK_FILES:
+        work_path = os.path.join(WORK_DIR, f"{base_name}_processed.jpg")
+        with open(work_path, "wb") as f:
+            f.write(payload)
+        print(f"🛠️ Processed image saved → {work_path}")
+    
+    print(f"🛠️ Processed image ready: {len(payload)} bytes")
+    return payload, work_path
 
 
-def enhance_with_cerebrium(work_path):
+def enhance_with_cerebrium(image_bytes, name):
     """
     Enhance image menggunakan Cerebrium API dengan AI models
     
     Args:
-        work_path (str): Path ke file yang akan di-enhance
+        image_bytes (bytes): JPEG payload dari prepare_for_api
+        name (str): Nama foto (untuk log)
     
     Returns:
         tuple: (success: bool, enhanced_bytes: bytes or error_message: str)
     """
     # Get current task based on active task type
-    current_task = TASK_OPTIONS.get(ACTIVE_TASK_TYPE, ENHANCEMENT_TASK)
+    current_task = get_current_task()
     
-    print(f"🚀 Sending {os.path.basename(work_path)} to Cerebrium AI...")
+    print(f"🚀 Sending {name} to Cerebrium AI...")
     print(f"🤖 Task Type: {ACTIVE_TASK_TYPE}")
     print(f"🎯 AI Task: {current_task}")
     
@@ -137,22 +223,77 @@ def enhance_with_cerebrium(work_path):
         print("🔥 AI Process: 5R crop + enhancement")
         print("   📈 Expected: Wedding photo format + quality improvement")
     
-    success, result = enhance_image_cerebrium(
-        image_path=work_path,
-        task=current_task,
-        api_endpoint=CEREBRIUM_API,
-        auth_token=CEREBRIUM_AUTH_TOKEN
-    )
+    # Payload identik yang pernah di-enhance: ambil dari cache, tanpa request GPU
+    if ENABLE_RESULT_CACHE:
+        cache = get_cache()
+        key = cache_key(image_bytes, current_task, CEREBRIUM_ENDPOINT_VERSION, TASK_TILING.get(current_task))
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"💾 Cache hit for {name}, skipping Cerebrium ({cache.summary()})")
+            return True, cached
+    
+    # Router bersama: request di-route ke endpoint tercepat dari CEREBRIUM_ENDPOINTS,
+    # koneksi tiap endpoint di-pool antar foto dan antar tile
+    client = get_router()
+    if ENABLE_HEDGING:
+        client = get_hedged_client(client)
+    breaker = get_breaker("Cerebrium")
+    
+    # Setiap request (atau tile) di-retry untuk error sementara, lewat circuit breaker.
+    # Dengan fallback lokal, circuit yang open tidak ditunggu: request langsung gagal
+    # (→ engine lokal), kecuali setelah CIRCUIT_RESET_TIMEOUT satu request dikirim
+    # sebagai probe, sehingga circuit bisa menutup lagi saat Cerebrium pulih.
+    # Threshold hedging dihitung terpisah untuk tile dan foto utuh.
+    def send(payload, tile=False):
+        options = {"tile": tile} if ENABLE_HEDGING else {}
+        return call_with_retry(lambda: client.enhance(current_task, image_bytes=payload, **options), breaker,
+                               wait=not ENABLE_LOCAL_FALLBACK)
+    
+    # Input besar dipecah jadi tile yang dikirim concurrent (lihat TASK_TILING)
+    started = time.time()
+    tiling = TASK_TILING.get(current_task)
+    if tiling and needs_tiling(Image.open(io.BytesIO(image_bytes)).size, tiling["tile_size"]):
+        success, result = enhance_tiled(
+            image_bytes, lambda payload: send(payload, tile=True),
+            tiling["tile_size"], tiling["overlap"], TILE_WORKERS
+        )
+    else:
+        success, result = send(image_bytes)
     
     if success:
+        if ENABLE_RESULT_CACHE:
+            cache.put(key, result, seconds=time.time() - started, task=current_task)
         print(f"✅ AI enhancement successful! Size: {len(result)} bytes")
         print(f"🎉 {current_task} processing completed!")
         return True, result
+    elif ENABLE_LOCAL_FALLBACK and is_retryable(result):
+        return _enhance_locally(image_bytes, current_task, name, result)
     else:
         print(f"❌ AI enhancement failed: {result}")
         return False, result
 
 
+def _enhance_locally(image_bytes, task, name, reason):
+    """Fallback ke engine CPU lokal; hasilnya tidak di-cache, jadi payload yang sama dikirim ke Cerebrium lagi lain kali"""
+    print(f"🖥️ Cerebrium unavailable ({reason}), enhancing {name} locally on CPU")
+    started = time.time()
+    success, result = enhance_local(image_bytes, task)
+    if success:
+        print(f"✅ Local enhancement done in {time.time() - started:.1f}s. Size: {len(result)} bytes")
+    else:
+        print(f"❌ Local enhancement failed: {result}")
+    return success, result
+
+
+def enhanced_file_name(counter):
+    """
+    Returns:
+        tuple: (enhance_path, enhance_name) untuk counter ini
+    """
+    enhance_name = f"{OUTPUT_PREFIX}_{counter:03d}.jpg"
+    return os.path.join(ENHANCED_DIR, enhance_name), enhance_name
+
+
 def save_enhanced_image(enhanced_bytes, counter):
     """
     Save enhanced image ke disk
@@ -164,8 +305,7 @@ def save_enhanced_image(enhanced_bytes, counter):
     Returns:
         str: Path ke enhanced file
     """
-    enhance_name = f"{OUTPUT_PREFIX}_{counter:03d}.jpg"
-    enhance_path = os.path.join(ENHANCED_DIR, enhance_name)
+    enhance_path, enhance_name = enhanced_file_name(counter)
     
     with open(enhance_path, "wb") as out:
         out.write(enhanced_bytes)
@@ -174,16 +314,31 @@ def save_enhanced_image(enhanced_bytes, counter):
     return enhance_path, enhance_name
 
 
-def process_photo(input_path, counter):
+# Thread untuk menulis hasil ke ENHANCED_DIR selagi upload berjalan dari memory
+_save_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="save")
+
+
+def save_enhanced_image_async(enhanced_bytes, counter):
+    """
+    Save enhanced image ke disk di background thread, supaya upload bisa
+    langsung dimulai dari memory; file lokal tetap jadi cadangan
+    
+    Returns:
+        concurrent.futures.Future: Hasilnya (enhance_path, enhance_name)
+    """
+    return _save_executor.submit(save_enhanced_image, enhanced_bytes, counter)
+
+
+def prepare_photo(input_path):
     """
-    Main photo processing function
+    Stage prepare: decode, backup dan siapkan file untuk API
+    File harus sudah selesai ditransfer (lihat wait_until_complete)
     
     Args:
         input_path (str): Path ke file input
-        counter (int): Counter untuk naming
     
     Returns:
-        bool: True jika berhasil, False jika gagal
+        tuple: (backup_path, payload, work_path), atau None jika file tidak bisa diproses
     """
     fname = os.path.basename(input_path)
     base, ext = os.path.splitext(fname)
@@ -192,39 +347,93 @@ def process_photo(input_path, counter):
     # Deteksi file type
     is_raw = ext in [".cr2", ".nef", ".arw", ".dng"]
     
+    # Process based on file type
+    if is_raw:
+        img = process_raw_file(input_path, base)
+        if img is None:
+            return None
+    else:
+        img = process_regular_image(input_path)
+    
+    # Backup JPG: input JPEG di-copy apa adanya, format lain di-convert
+    if ext == ".jpg":
+        backup_path = backup_original_jpg(input_path, base)
+        backup_bytes = None
+    else:
+        backup_path, backup_bytes = backup_jpg(img, base)
+    
+    # Prepare for API (payload tetap di memory)
+    payload, work_path = prepare_for_api(img, base, encoded=backup_bytes)
+    return backup_path, payload, work_path
+
+
+def upload_enhanced(enhance_path, enhance_name, enhanced_bytes=None, pool=None):
+    """
+    Stage upload: masukkan hasil enhancement ke queue upload R2 (tidak blocking)
+    
+    Args:
+        enhance_path (str): Path ke enhanced file
+        enhance_name (str): Nama file di R2
+        enhanced_bytes (bytes): Hasil enhancement di memory; jika diisi, upload
+            tidak membaca file dari disk
+        pool (UploadPool): Worker pool upload (default: pool bersama)
+    
+    Returns:
+        UploadTask: task.future berisi (upload_success: bool, public_url or error_message)
+    """
+    task = (pool or get_upload_pool()).submit(enhance_path, enhance_name, enhanced_bytes)
+    
+    def report(future):
+        upload_success, result = future.result()
+        if not upload_success:
+            print(f"⚠️ File saved locally but upload failed: {enhance_path}")
+            print(f"   Error: {result}")
+            if ENABLE_UPLOAD_RECONCILER:
+                print(f"   It will be retried automatically in the background (see failed_uploads.txt)")
+            else:
+                print(f"   You can manually upload later or check failed_uploads.txt")
+    
+    task.future.add_done_callback(report)
+    return task
+
+
+def process_photo(input_path, counter):
+    """
+    Main photo processing function (sequential, satu foto sekaligus)
+    
+    Untuk monitoring folder gunakan pipeline.PhotoPipeline yang menjalankan
+    stage yang sama secara concurrent. Upload berjalan di background
+    (uploader.UploadPool), hasilnya dicatat di urls.txt / failed_uploads.txt.
+    
+    Args:
+        input_path (str): Path ke file input
+        counter (int): Counter untuk naming
+    
+    Returns:
+        bool: True jika berhasil, False jika gagal
+    """
+    fname = os.path.basename(input_path)
+    
     try:
         # Wait until file transfer complete
         wait_until_complete(input_path)
         
-        # Process based on file type
-        if is_raw:
-            img = process_raw_file(input_path, base)
-            if img is None:
-                return False
-        else:
-            img = process_regular_image(input_path)
-        
-        # Backup JPG
-        backup_jpg(img, base)
-        
-        # Prepare for API
-        work_path = prepare_for_api(img, base)
+        prepared = prepare_photo(input_path)
+        if prepared is None:
+            return False
+        backup_path, payload, work_path = prepared
         
         # Enhance with Cerebrium
-        success, enhanced_bytes = enhance_with_cerebrium(work_path)
+        success, enhanced_bytes = enhance_with_cerebrium(payload, fname)
         if not success:
             raise RuntimeError(f"Enhancement failed: {enhanced_bytes}")
         
-        # Save enhanced image
-        enhance_path, enhance_name = save_enhanced_image(enhanced_bytes, counter)
-        
-        # Upload to R2
-        upload_success, result = upload_to_r2(enhance_path, enhance_name)
-        
-        if not upload_success:
-            print(f"⚠️ File saved locally but upload failed: {enhance_path}")
-            print(f"   Error: {result}")
-            print(f"   You can manually upload later or check failed_uploads.txt")
+        # Save enhanced image (background) sambil upload to R2 dari memory;
+        # foto berikutnya tidak menunggu upload selesai
+        enhance_path, enhance_name = enhanced_file_name(counter)
+        saved = save_enhanced_image_async(enhanced_bytes, counter)
+        upload_enhanced(enhance_path, enhance_name, enhanced_bytes)
+        saved.result()
         
         return True
         
@@ -232,4 +441,4 @@ def process_photo(input_path, counter):
         error_msg = f"Error memproses {fname}: {e}"
         print(f"❌ {error_msg}")
         log_error(fname, str(e))
-        return False
\ No newline at end of file
+        return False
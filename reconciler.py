@@ -0,0 +1,162 @@
+"""
+Upload reconciler: kirim ulang upload yang gagal secara otomatis
+Upload yang tetap gagal (mis. Wi-Fi venue putus) masuk retry queue di JobStore.
+Daemon ini mengecek koneksi R2 secara berkala, dan begitu online mengirim
+queue secara concurrent dengan exponential backoff per file.
+"""
+
+import os
+import threading
+from config import (
+    ENHANCED_DIR, FAILED_UPLOADS_LOG, UPLOAD_RECONCILE_INTERVAL, UPLOAD_RECONCILE_WORKERS,
+    UPLOAD_RECONCILE_BASE_DELAY, UPLOAD_RECONCILE_MAX_DELAY
+)
+from jobstore import STATUS_DONE, STATUS_FAILED
+from resilience import backoff_delay
+from uploader import UploadPool, r2_reachable
+
+
+def parse_failed_log(path=FAILED_UPLOADS_LOG):
+    """
+    Baca failed_uploads.txt ("<remote_name>: <error>" per baris)
+
+    Returns:
+        list[tuple]: (remote_name, error) sesuai urutan di file
+    """
+    if not os.path.exists(path):
+        return []
+    entries = []
+    with open(path) as f:
+        for line in f:
+            name, _, error = line.strip().partition(": ")
+            if name:
+                entries.append((name, error))
+    return entries
+
+
+class UploadReconciler:
+    """
+    Background daemon yang men-drain retry queue upload di JobStore
+
+    Setiap UPLOAD_RECONCILE_INTERVAL detik (selama queue tidak kosong) R2
+    dicek dengan head_bucket. Saat offline tidak ada attempt yang dipakai;
+    saat koneksi kembali semua entry langsung dijadwalkan ulang. File yang
+    gagal saat online di-retry dengan backoff eksponensial.
+    """
+
+    def __init__(self, store, workers=UPLOAD_RECONCILE_WORKERS, interval=UPLOAD_RECONCILE_INTERVAL,
+                 base_delay=UPLOAD_RECONCILE_BASE_DELAY, max_delay=UPLOAD_RECONCILE_MAX_DELAY):
+        self.store = store
+        self.interval = interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.pool = UploadPool(workers, retries=1, log_failures=False, store=store)
+        self.online = True
+        self.uploaded = 0
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def import_failed_log(self, path=FAILED_UPLOADS_LOG, enhanced_dir=ENHANCED_DIR):
+        """
+        Masukkan entry failed_uploads.txt ke retry queue (sekali per remote name)
+
+        Returns:
+            int: Jumlah entry baru yang masuk queue
+        """
+        imported = 0
+        for name, error in parse_failed_log(path):
+            local_path = os.path.join(enhanced_dir, name)
+            if not os.path.exists(local_path):
+                print(f"⚠️ Cannot retry {name}: {local_path} not found")
+                continue
+            if self.store.queue_upload(name, local_path, error=error, replace=False):
+                imported += 1
+        return imported
+
+    def start(self):
+        self.pool.start()
+        self._thread = threading.Thread(target=self._loop, name="upload-reconciler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Hentikan daemon; upload yang sedang berjalan diselesaikan dulu"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.pool.stop()
+
+    def notify(self):
+        """Ada entry baru di queue: cek sekarang tanpa menunggu interval"""
+        self._wakeup.set()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"⚠️ Upload reconciler error: {e}")
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def run_once(self):
+        """
+        Satu putaran: cek koneksi lalu submit semua entry yang sudah jatuh tempo
+
+        Returns:
+            int: Jumlah upload yang di-submit
+        """
+        pending = self.store.pending_uploads()
+        if not pending:
+            return 0
+
+        if not r2_reachable():
+            if self.online:
+                print(f"📴 R2 unreachable, {pending} upload(s) waiting for connectivity")
+            self.online = False
+            return 0
+        if not self.online:
+            print(f"📶 R2 reachable again, retrying {pending} pending upload(s)")
+            self.online = True
+            self.store.retry_uploads_now()
+
+        submitted = 0
+        # Ambil lebih banyak dari jumlah worker supaya queue pool tidak kosong sampai putaran berikutnya
+        for row in self.store.due_uploads(limit=self.pool.workers * 4):
+            name = row["remote_name"]
+            with self._lock:
+                if name in self._inflight:
+                    continue
+                self._inflight.add(name)
+            if not os.path.exists(row["local_path"]):
+                self._finished(row, STATUS_FAILED, error=f"Local file missing: {row['local_path']}")
+                print(f"❌ Giving up on {name}: {row['local_path']} no longer exists")
+                continue
+            task = self.pool.submit(row["local_path"], name)
+            task.future.add_done_callback(lambda future, row=row: self._uploaded(row, future))
+            submitted += 1
+        return submitted
+
+    def _uploaded(self, row, future):
+        success, result = future.result()
+        if success:
+            self._finished(row, STATUS_DONE, upload_url=result)
+            if row["job_id"] is not None:
+                self.store.mark_done(row["job_id"], result)
+            self.uploaded += 1
+            print(f"📮 Retried upload succeeded: {row['remote_name']}")
+            return
+
+        delay = backoff_delay(row["attempts"], self.base_delay, self.max_delay)
+        self.store.reschedule_upload(row["remote_name"], delay, result)
+        with self._lock:
+            self._inflight.discard(row["remote_name"])
+        print(f"🔁 Upload retry for {row['remote_name']} failed, next attempt in {delay:.0f}s")
+
+    def _finished(self, row, status, upload_url=None, error=None):
+        self.store.finish_upload(row["remote_name"], status, upload_url=upload_url, error=error)
+        with self._lock:
+            self._inflight.discard(row["remote_name"])
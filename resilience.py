@@ -0,0 +1,169 @@
+"""
+Retry dengan exponential backoff + jitter dan circuit breaker untuk request ke Cerebrium
+Error sementara (timeout, koneksi putus, 429, 5xx) di-retry; error payload (4xx)
+langsung gagal. Saat endpoint down, circuit breaker menahan dispatch sehingga
+queue pipeline menunggu lalu lanjut berurutan setelah endpoint pulih.
+"""
+
+import random
+import threading
+import time
+from config import (
+    ENHANCE_MAX_RETRIES, ENHANCE_RETRY_BASE_DELAY, ENHANCE_RETRY_MAX_DELAY,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_TIMEOUT, CIRCUIT_MAX_WAIT
+)
+from enhance_image_cerebrium import APIError, is_retryable
+
+
+def backoff_delay(attempt, base_delay=ENHANCE_RETRY_BASE_DELAY, max_delay=ENHANCE_RETRY_MAX_DELAY):
+    """Exponential backoff dengan full jitter: random di [0, min(max, base * 2^attempt)]"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker per endpoint
+
+    closed    → request jalan normal; `failure_threshold` kegagalan berturut-turut
+                membuka circuit
+    open      → semua caller menunggu di acquire() selama `reset_timeout`
+    half_open → satu caller dikirim sebagai probe; sukses menutup circuit dan
+                melepas semua caller, gagal membuka circuit lagi
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, reset_timeout=CIRCUIT_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._cond = threading.Condition()
+
+    @property
+    def is_open(self):
+        with self._cond:
+            return self.state != self.CLOSED
+
+    def acquire(self, timeout=None):
+        """
+        Tunggu sampai request boleh dikirim
+
+        Args:
+            timeout (float): Maksimal detik menunggu (None = tanpa batas)
+
+        Returns:
+            bool: False jika circuit masih open setelah timeout
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._cond:
+            while True:
+                if self.state == self.CLOSED:
+                    return True
+                now = time.time()
+                if self.state == self.OPEN and now - self.opened_at >= self.reset_timeout:
+                    self.state = self.HALF_OPEN
+                if self.state == self.HALF_OPEN and not self._probing:
+                    self._probing = True
+                    return True
+                if deadline is not None and now >= deadline:
+                    return False
+                wait = self.opened_at + self.reset_timeout - now if self.state == self.OPEN else self.reset_timeout
+                if deadline is not None:
+                    wait = min(wait, deadline - now)
+                self._cond.wait(max(0.05, wait))
+
+    def record_success(self):
+        """Endpoint merespons (termasuk error 4xx): tutup circuit"""
+        with self._cond:
+            if self.state != self.CLOSED:
+                print(f"🟢 Circuit closed: {self.name} is responding again")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+            self._cond.notify_all()
+
+    def record_failure(self):
+        """
+        Catat kegagalan sementara (timeout, 429, 5xx)
+
+        Returns:
+            bool: True jika circuit sekarang open
+        """
+        with self._cond:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state == self.CLOSED:
+                    print(f"🔴 Circuit open: {self.name} failed {self.failures}x, "
+                          f"pausing requests for {self.reset_timeout}s")
+                self.state = self.OPEN
+                self.opened_at = time.time()
+                self._probing = False
+                self._cond.notify_all()
+                return True
+            return False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """CircuitBreaker bersama per endpoint"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def call_with_retry(call, breaker, retries=ENHANCE_MAX_RETRIES, max_wait=CIRCUIT_MAX_WAIT, wait=True):
+    """
+    Jalankan call() dengan retry + backoff, melewati circuit breaker
+
+    Kegagalan yang membuka circuit tidak menghabiskan jatah retry: caller
+    menunggu circuit pulih (maksimal max_wait detik) lalu mencoba lagi.
+
+    Args:
+        call (callable): call() → (success, result_bytes or error_message)
+        breaker (CircuitBreaker): Circuit breaker endpoint
+        retries (int): Jumlah retry untuk error sementara
+        max_wait (float): Maksimal detik menunggu circuit yang open (0 = tanpa batas)
+        wait (bool): False = langsung gagal jika circuit open (mis. ada fallback lokal)
+
+    Returns:
+        tuple: (success: bool, result_bytes or error_message)
+    """
+    deadline = time.time() + max_wait if max_wait else None
+    attempt = 0
+    while True:
+        if not wait:
+            timeout = 0.0
+        else:
+            timeout = None if deadline is None else max(0.0, deadline - time.time())
+        if not breaker.acquire(timeout):
+            waited = f" after {max_wait}s" if wait else ""
+            return False, APIError(f"Circuit open: {breaker.name} unavailable{waited}", retryable=True)
+
+        success, result = call()
+        if success or not is_retryable(result):
+            breaker.record_success()
+            return success, result
+
+        if breaker.record_failure():
+            # Endpoint down: tunggu di acquire() tanpa menghitung attempt
+            continue
+        if attempt >= retries:
+            return False, result
+        delay = backoff_delay(attempt)
+        retry_after = getattr(result, "retry_after", None)
+        if retry_after:
+            delay = max(delay, min(retry_after, ENHANCE_RETRY_MAX_DELAY))
+        attempt += 1
+        print(f"🔁 Retry {attempt}/{retries} in {delay:.1f}s: {result}")
+        time.sleep(delay)
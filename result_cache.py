@@ -0,0 +1,194 @@
+"""
+Content-addressed cache untuk hasil enhancement di disk
+Payload yang identik (re-run folder, ganti balik ACTIVE_TASK_TYPE, retry setelah
+upload gagal) tidak dikirim lagi ke Cerebrium, jadi tidak bayar GPU dua kali
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from config import RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES
+
+
+def cache_key(payload, task, version, params=None):
+    """
+    Key cache: sha256 dari payload yang dikirim + task + versi model + params
+
+    URL endpoint sengaja tidak ikut: semua endpoint yang di-route menjalankan
+    model yang sama, jadi hasilnya boleh dipakai ulang dari endpoint mana pun.
+
+    Args:
+        params (dict): Parameter yang mempengaruhi hasil (mis. tiling)
+
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    for part in (task, version, json.dumps(params, sort_keys=True)):
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\0")
+    digest.update(payload)
+    return digest.hexdigest()
+
+
+class _Entry:
+    def __init__(self, size, seconds):
+        self.size = size
+        self.seconds = seconds
+
+
+class ResultCache:
+    """
+    Cache hasil di RESULT_CACHE_DIR dengan byte budget dan LRU eviction
+
+    Setiap entry adalah `<key>.bin` (hasil) dan `<key>.json` (metadata, mis.
+    durasi request asli untuk menghitung GPU seconds yang dihemat). File
+    ditulis ke file sementara lalu di-rename, `.bin` lebih dulu, jadi crash
+    tidak meninggalkan entry setengah jadi; metadata tanpa `.bin` dihapus saat
+    startup. Urutan LRU dipulihkan dari mtime saat startup.
+    """
+
+    def __init__(self, directory=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.seconds_saved = 0.0
+        self._entries = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _path(self, key, ext):
+        return os.path.join(self.directory, f"{key}.{ext}")
+
+    def _load(self):
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".tmp"):
+                os.remove(entry.path)  # sisa write yang terputus
+                continue
+            if entry.name.endswith(".json"):
+                if not os.path.exists(self._path(entry.name[:-5], "bin")):
+                    os.remove(entry.path)  # metadata tanpa hasil (entry lama / evict terputus)
+                continue
+            if not entry.name.endswith(".bin"):
+                continue
+            key = entry.name[:-4]
+            stat = entry.stat()
+            found.append((stat.st_mtime, key, stat.st_size, self._read_seconds(key)))
+        for _, key, size, seconds in sorted(found):
+            self._entries[key] = _Entry(size, seconds)
+            self._total += size
+        with self._lock:
+            self._evict()
+
+    def _read_seconds(self, key):
+        try:
+            with open(self._path(key, "json"), encoding="utf-8") as f:
+                return float(json.load(f).get("seconds", 0.0))
+        except (OSError, ValueError):
+            return 0.0
+
+    def get(self, key):
+        """
+        Ambil hasil dari cache
+
+        Returns:
+            bytes or None: Hasil enhancement, atau None jika tidak ada di cache
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+        try:
+            with open(self._path(key, "bin"), "rb") as f:
+                data = f.read()
+            os.utime(self._path(key, "bin"))  # mtime = urutan LRU setelah restart
+        except OSError:
+            with self._lock:
+                if self._entries.pop(key, None) is not None:
+                    self._total -= entry.size
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+            self.seconds_saved += entry.seconds
+        return data
+
+    def put(self, key, data, seconds=0.0, task=None):
+        """
+        Simpan hasil ke cache (atomic), lalu evict entry terlama jika melebihi budget
+
+        Args:
+            key (str): Dari cache_key
+            data (bytes): Hasil enhancement
+            seconds (float): Durasi request ke Cerebrium (untuk statistik)
+            task (str): Task AI (metadata)
+        """
+        if len(data) > self.max_bytes:
+            return
+        meta = {"task": task, "seconds": round(seconds, 3), "size": len(data)}
+        self._write(self._path(key, "bin"), data)
+        self._write(self._path(key, "json"), json.dumps(meta).encode("utf-8"))
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total -= old.size
+            self._entries[key] = _Entry(len(data), seconds)
+            self._total += len(data)
+            self._evict()
+
+    def _write(self, path, data):
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _evict(self):
+        while self._total > self.max_bytes and self._entries:
+            key, entry = self._entries.popitem(last=False)
+            self._total -= entry.size
+            for ext in ("bin", "json"):
+                try:
+                    os.remove(self._path(key, ext))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        """
+        Returns:
+            dict: hits, misses, seconds_saved, entries, bytes
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "seconds_saved": self.seconds_saved,
+                "entries": len(self._entries),
+                "bytes": self._total,
+            }
+
+    def summary(self):
+        stats = self.stats()
+        return (f"{stats['hits']} hits / {stats['misses']} misses, "
+                f"~{stats['seconds_saved']:.1f}s GPU saved, "
+                f"{stats['entries']} entries ({stats['bytes'] / 1024 / 1024:.1f} MB)")
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """ResultCache bersama untuk proses ini (dibuat saat pertama dipakai)"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache()
+        return _cache
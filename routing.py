@@ -0,0 +1,145 @@
+"""
+Routing request ke beberapa deployment Cerebrium (region/app) sekaligus
+Setiap request dikirim ke endpoint dengan perkiraan latency terendah (EWMA
+latency, jumlah request yang sedang berjalan, dan EWMA error rate). Endpoint
+yang gagal berturut-turut di-eject sementara lalu dicoba lagi.
+"""
+
+import threading
+import time
+from config import (
+    CEREBRIUM_ENDPOINTS, CEREBRIUM_POOL_SIZE, ROUTING_EWMA_ALPHA,
+    ROUTING_EJECT_FAILURES, ROUTING_EJECT_SECONDS
+)
+from enhance_image_cerebrium import get_client, is_retryable
+
+# Error 4xx yang menandakan endpoint salah konfigurasi (token, app/URL), bukan payload
+ENDPOINT_ERROR_STATUSES = (401, 403, 404)
+
+
+def is_endpoint_error(error):
+    """
+    True jika kegagalan disebabkan endpoint: error sementara (timeout, koneksi,
+    429, 5xx) atau 401/403/404. Error payload (400/413/422) dan request yang
+    dibatalkan tidak dihitung.
+    """
+    return is_retryable(error) or getattr(error, "status", None) in ENDPOINT_ERROR_STATUSES
+
+
+class Endpoint:
+    """Statistik live satu endpoint"""
+
+    def __init__(self, url, token=None):
+        self.url = url
+        self.token = token
+        self.latency = None  # EWMA detik per request sukses
+        self.error_rate = 0.0  # EWMA, 0..1
+        self.failures = 0  # kegagalan berturut-turut
+        self.in_flight = 0
+        self.ejected_until = 0.0
+
+    def score(self, default_latency=0.0):
+        """
+        Perkiraan waktu tunggu; endpoint yang belum pernah diukur dan belum
+        pernah gagal dicoba duluan. Endpoint yang belum pernah sukses tapi
+        sudah gagal memakai default_latency (rata-rata endpoint lain) dengan
+        penalti error rate.
+        """
+        latency = self.latency
+        if latency is None:
+            if not self.error_rate:
+                return self.in_flight
+            latency = default_latency
+        return latency * (1 + self.in_flight) / max(0.05, 1 - self.error_rate)
+
+
+class EndpointRouter:
+    """
+    Pengganti CerebriumClient dengan API enhance() yang sama, di atas
+    beberapa endpoint (masing-masing dengan token dan pool koneksi sendiri)
+    """
+
+    def __init__(self, endpoints=CEREBRIUM_ENDPOINTS, pool_size=CEREBRIUM_POOL_SIZE,
+                 alpha=ROUTING_EWMA_ALPHA, eject_failures=ROUTING_EJECT_FAILURES,
+                 eject_seconds=ROUTING_EJECT_SECONDS):
+        if not endpoints:
+            raise ValueError("CEREBRIUM_ENDPOINTS is empty")
+        self.endpoints = [Endpoint(e["url"], e.get("token")) for e in endpoints]
+        self.pool_size = pool_size
+        self.alpha = alpha
+        self.eject_failures = eject_failures
+        self.eject_seconds = eject_seconds
+        self._lock = threading.Lock()
+
+    def choose(self):
+        """Endpoint sehat dengan score terendah (atau yang paling cepat selesai di-eject)"""
+        now = time.time()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.ejected_until <= now]
+            if healthy:
+                measured = [e.latency for e in self.endpoints if e.latency is not None]
+                default = sum(measured) / len(measured) if measured else 0.0
+                endpoint = min(healthy, key=lambda e: (e.score(default), e.error_rate))
+            else:
+                endpoint = min(self.endpoints, key=lambda e: e.ejected_until)
+            endpoint.in_flight += 1
+            return endpoint
+
+    def record(self, endpoint, seconds, success, error=None):
+        with self._lock:
+            endpoint.in_flight -= 1
+            if success:
+                endpoint.latency = seconds if endpoint.latency is None else (
+                    self.alpha * seconds + (1 - self.alpha) * endpoint.latency)
+                endpoint.error_rate *= 1 - self.alpha
+                endpoint.failures = 0
+            elif is_endpoint_error(error):
+                endpoint.error_rate = self.alpha + (1 - self.alpha) * endpoint.error_rate
+                endpoint.failures += 1
+                if endpoint.failures >= self.eject_failures and endpoint.ejected_until <= time.time():
+                    endpoint.ejected_until = time.time() + self.eject_seconds
+                    print(f"🚫 Ejecting {endpoint.url} for {self.eject_seconds}s "
+                          f"({endpoint.failures} failures in a row)")
+            # Error payload (400/413/422) atau dibatalkan: endpoint sehat, tidak dihitung
+
+    def enhance(self, task, image_path=None, image_bytes=None, cancel=None):
+        endpoint = self.choose()
+        client = get_client(endpoint.url, endpoint.token, pool_size=self.pool_size)
+        started = time.time()
+        success, result = False, None
+        try:
+            success, result = client.enhance(task, image_path=image_path, image_bytes=image_bytes, cancel=cancel)
+            return success, result
+        finally:
+            self.record(endpoint, time.time() - started, success, result)
+
+    def stats(self):
+        """
+        Returns:
+            list[dict]: url, latency, error_rate, in_flight, ejected per endpoint
+        """
+        now = time.time()
+        with self._lock:
+            return [
+                {
+                    "url": e.url,
+                    "latency": e.latency,
+                    "error_rate": e.error_rate,
+                    "in_flight": e.in_flight,
+                    "ejected": e.ejected_until > now,
+                }
+                for e in self.endpoints
+            ]
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """EndpointRouter bersama untuk CEREBRIUM_ENDPOINTS"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = EndpointRouter()
+        return _router
@@ -0,0 +1,102 @@
+"""
+Catch-up scan untuk INPUT_DIR
+Menemukan file yang masuk saat aplikasi mati (atau sebelum observer start)
+dan hanya meng-enqueue file yang belum ada di processed-file index
+"""
+
+import os
+import time
+from config import (
+    INPUT_DIR, SUPPORTED_FORMATS, JPG_BACKUP_DIR, RAW_BACKUP_DIR,
+    FILE_STABILITY_CHECKS, FILE_STABILITY_INTERVAL
+)
+
+# content_hash untuk entry index hasil seeding (file tidak di-hash)
+SEEDED_HASH = ""
+
+
+def has_backup(path):
+    """True jika input ini sudah pernah diproses (ada backup JPG/RAW dari versi sebelumnya)"""
+    name = os.path.basename(path)
+    base = os.path.splitext(name)[0]
+    return (os.path.exists(os.path.join(JPG_BACKUP_DIR, base + ".jpg"))
+            or os.path.exists(os.path.join(RAW_BACKUP_DIR, name)))
+
+
+def seed_index(store, entries):
+    """
+    Run pertama (index masih kosong, mis. setelah upgrade): input yang sudah
+    punya backup dianggap sudah diproses, sehingga tidak dikirim ulang ke
+    Cerebrium dan tidak diupload dengan nomor counter baru
+
+    Args:
+        entries (list): (path, stat) semua file input
+
+    Returns:
+        set: Path yang dimasukkan ke index
+    """
+    seeded = set()
+    for path, stat in entries:
+        if has_backup(path):
+            store.record_file(path, stat.st_size, stat.st_mtime_ns, SEEDED_HASH)
+            seeded.add(path)
+    if seeded:
+        print(f"🌱 First run: {len(seeded)} file(s) in the input folder already have a backup, skipping them")
+    return seeded
+
+
+def find_new_files(store, input_dir=INPUT_DIR):
+    """
+    Scan input_dir dengan os.scandir dan bandingkan dengan processed-file index
+
+    File dianggap sudah dikenal jika size dan mtime sama dengan index, sehingga
+    tidak perlu hashing. File yang berubah/baru dikembalikan; stage prepare
+    yang menghitung content hash dan men-skip file yang job-nya sudah selesai.
+    Jika index masih kosong, index di-seed dulu dari backup (lihat seed_index).
+
+    Returns:
+        list[str]: Path file baru, urut berdasarkan mtime (paling lama dulu)
+    """
+    index = store.file_index()
+    entries = []
+    with os.scandir(input_dir) as it:
+        for entry in it:
+            if not entry.name.lower().endswith(SUPPORTED_FORMATS):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if index.get(entry.path) == (stat.st_size, stat.st_mtime_ns):
+                continue
+            entries.append((entry.path, stat))
+
+    seeded = seed_index(store, entries) if not index else set()
+    new_files = sorted((stat.st_mtime_ns, path) for path, stat in entries if path not in seeded)
+    return [path for _, path in new_files]
+
+
+def catch_up_scan(pipeline, store, input_dir=INPUT_DIR):
+    """
+    Enqueue semua file baru di input_dir ke pipeline
+
+    Returns:
+        int: Jumlah file yang di-enqueue
+    """
+    start = time.time()
+    new_files = find_new_files(store, input_dir)
+    print(f"🔎 Catch-up scan: {len(new_files)} new file(s) in {input_dir}/ ({time.time() - start:.2f}s)")
+    # File yang tidak berubah lebih lama dari window stabilitas sudah pasti
+    # selesai ditulis: stage prepare tidak perlu polling ukuran
+    settled_before = time.time() - FILE_STABILITY_CHECKS * FILE_STABILITY_INTERVAL
+    queued = 0
+    for path in new_files:
+        try:
+            complete = os.stat(path).st_mtime < settled_before
+        except FileNotFoundError:
+            continue
+        if pipeline.submit(path, complete=complete):
+            queued += 1
+    return queued
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Module berada di root repo (tidak ada package)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
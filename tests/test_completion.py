@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+
+from completion import CompletionTracker
+
+
+def _tracker(completed):
+    # Polling fallback tidak di-start: hanya event yang bisa menyelesaikan file
+    return CompletionTracker(completed.append, checks=3, interval=0.5, timeout=60)
+
+
+def test_created_while_writer_pauses_stays_pending(tmp_path):
+    path = str(tmp_path / "IMG_0001.jpg")
+    completed = []
+    tracker = _tracker(completed)
+    started = threading.Event()
+
+    def writer():
+        with open(path, "wb") as f:
+            f.write(b"\xff\xd8" + b"a" * 1024)
+            f.flush()
+            started.set()
+            # Jeda lebih lama dari recheck delay lama (0.1s)
+            time.sleep(0.3)
+            f.write(b"b" * 1024)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    started.wait()
+    time.sleep(0.15)
+    tracker.file_created(path)
+    assert completed == []
+    assert path in tracker._pending
+
+    thread.join()
+    tracker.file_closed(path)
+    assert completed == [path]
+    assert os.path.getsize(path) == 2 + 2048
+    assert path not in tracker._pending
+
+
+def test_created_with_old_mtime_completes_immediately(tmp_path):
+    path = str(tmp_path / "IMG_0002.jpg")
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8" + b"a" * 1024)
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+    completed = []
+    tracker = _tracker(completed)
+    tracker.file_created(path)
+    assert completed == [path]
+    assert path not in tracker._pending
+
+
+def test_created_empty_file_stays_pending(tmp_path):
+    path = str(tmp_path / "IMG_0003.jpg")
+    open(path, "wb").close()
+    old = time.time() - 60
+    os.utime(path, (old, old))
+
+    completed = []
+    tracker = _tracker(completed)
+    tracker.file_created(path)
+    assert completed == []
+    assert path in tracker._pending
@@ -0,0 +1,36 @@
+import time
+
+from config import HEDGE_MIN_SAMPLES
+from hedging import HedgedClient, HedgeBudget, LatencyTracker
+
+
+class _Client:
+    pool_size = 2
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.calls = 0
+
+    def enhance(self, task, image_path=None, image_bytes=None, cancel=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        return True, image_bytes
+
+
+def test_tile_and_full_image_latency_tracked_separately():
+    tracker = LatencyTracker(window=HEDGE_MIN_SAMPLES)
+    client = _Client(delay=0.05)
+    hedged = HedgedClient(client, percentile=50, tracker=tracker, budget=HedgeBudget(per_minute=100))
+
+    # Tile cepat tidak boleh menurunkan threshold foto utuh
+    for _ in range(HEDGE_MIN_SAMPLES):
+        tracker.record(("upscale", True), 0.001)
+    assert tracker.percentile(("upscale", False), 50) is None
+
+    assert hedged.enhance("upscale", image_bytes=b"full") == (True, b"full")
+    assert client.calls == 1
+    assert hedged.hedges_sent == 0
+    assert tracker.percentile(("upscale", False), 50, min_samples=1) >= 0.05
+
+    assert hedged.enhance("upscale", image_bytes=b"tile", tile=True) == (True, b"tile")
+    assert hedged.hedges_sent == 1
@@ -0,0 +1,51 @@
+from concurrent.futures import Future
+
+from jobstore import JobStore
+from pipeline import PhotoJob, PhotoPipeline
+
+
+class _Reconciler:
+    def __init__(self):
+        self.notified = 0
+
+    def notify(self):
+        self.notified += 1
+
+
+def _done(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+
+def test_upload_failure_right_after_save_queues_retry(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"))
+    reconciler = _Reconciler()
+    pipeline = PhotoPipeline(1, store, reconciler=reconciler)
+
+    input_path = str(tmp_path / "IMG_0001.jpg")
+    job = PhotoJob(input_path)
+    job.load_row(store.get_or_create(input_path, "hash"))
+    job.counter = 1
+    job.enhance_name = "enhanced_1.jpg"
+
+    # Save sudah selesai tetapi callback _saved belum sempat jalan
+    enhanced_path = tmp_path / "enhanced_1.jpg"
+    enhanced_path.write_bytes(b"\xff\xd8enhanced")
+    job.save_future = _done((str(enhanced_path), "enhanced_1.jpg"))
+
+    pipeline._uploaded(job, _done((False, "Connection reset")))
+
+    assert job.enhanced_path == str(enhanced_path)
+    assert reconciler.notified == 1
+    [row] = store.due_uploads(limit=10)
+    assert row["remote_name"] == "enhanced_1.jpg"
+    assert row["local_path"] == str(enhanced_path)
+    assert row["job_id"] == job.job_id
+    assert row["error"] == "Connection reset"
+
+    # Checkpoint tersimpan, jadi resume tidak mengulang enhancement
+    stored = store.get_or_create(input_path, "hash")
+    assert stored["enhanced_path"] == str(enhanced_path)
+    assert stored["status"] == "failed"
+    store.close()
@@ -0,0 +1,127 @@
+"""
+Tiled enhancement untuk input besar
+Image dipecah jadi tile yang saling overlap, tile dikirim ke Cerebrium secara
+concurrent, lalu hasilnya disambung kembali dengan feathered blending di seam
+"""
+
+import io
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageChops
+from utils import encode_jpeg
+from enhance_image_cerebrium import APIError
+
+
+def _axis_positions(length, tile_size, overlap):
+    """Posisi awal tile di satu sumbu; tile terakhir menempel ke tepi image"""
+    if length <= tile_size:
+        return [0]
+    step = max(1, tile_size - overlap)
+    positions = list(range(0, length - tile_size, step))
+    positions.append(length - tile_size)
+    return positions
+
+
+def plan_tiles(width, height, tile_size, overlap):
+    """
+    Bagi image menjadi tile yang saling overlap
+
+    Returns:
+        list[tuple]: Box (left, top, right, bottom) per tile, urut per baris
+    """
+    boxes = []
+    for top in _axis_positions(height, tile_size, overlap):
+        for left in _axis_positions(width, tile_size, overlap):
+            boxes.append((left, top, min(left + tile_size, width), min(top + tile_size, height)))
+    return boxes
+
+
+def needs_tiling(size, tile_size):
+    width, height = size
+    return width > tile_size or height > tile_size
+
+
+def _ramp(length, size, horizontal):
+    """Gradient 0 → 255 sepanjang `length` pixel (untuk feathering seam)"""
+    gradient = Image.linear_gradient("L")
+    if horizontal:
+        gradient = gradient.transpose(Image.Transpose.TRANSPOSE)
+        return gradient.resize((length, size))
+    return gradient.resize((size, length))
+
+
+def _feather_mask(size, left_overlap, top_overlap):
+    """Mask tile: ramp di sisi kiri/atas yang overlap dengan tile sebelumnya"""
+    width, height = size
+    mask = Image.new("L", size, 255)
+    if left_overlap > 0:
+        strip = Image.new("L", size, 255)
+        strip.paste(_ramp(left_overlap, height, horizontal=True), (0, 0))
+        mask = ImageChops.darker(mask, strip)
+    if top_overlap > 0:
+        strip = Image.new("L", size, 255)
+        strip.paste(_ramp(top_overlap, width, horizontal=False), (0, 0))
+        mask = ImageChops.darker(mask, strip)
+    return mask
+
+
+def enhance_tiled(image_bytes, enhance_fn, tile_size, overlap, workers):
+    """
+    Enhance image per tile secara concurrent lalu stitch hasilnya
+
+    Args:
+        image_bytes (bytes): Image yang akan di-enhance (JPEG payload)
+        enhance_fn (callable): enhance_fn(tile_bytes) → (success, result_bytes or error)
+        tile_size (int): Ukuran tile (pixel, di input)
+        overlap (int): Overlap antar tile (pixel, di input)
+        workers (int): Jumlah tile yang dikirim bersamaan
+
+    Returns:
+        tuple: (success: bool, stitched JPEG bytes or error_message: str)
+    """
+    img = Image.open(io.BytesIO(image_bytes))
+    img.load()
+    boxes = plan_tiles(img.width, img.height, tile_size, overlap)
+    print(f"🧩 Tiling {img.width}x{img.height} into {len(boxes)} tiles "
+          f"({tile_size}px, overlap {overlap}px, {workers} concurrent)")
+
+    def run(box):
+        return enhance_fn(encode_jpeg(img.crop(box)))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="tile") as executor:
+        results = list(executor.map(run, boxes))
+
+    for index, (success, result) in enumerate(results):
+        if not success:
+            error = f"Tile {index + 1}/{len(boxes)} failed: {result}"
+            if isinstance(result, APIError):
+                # Klasifikasi retry tetap terbawa (mis. untuk fallback lokal)
+                error = APIError(error, retryable=result.retryable, status=result.status)
+            return False, error
+
+    # Skala output ditentukan dari hasil tile pertama (mis. 4x untuk Real-ESRGAN)
+    first = Image.open(io.BytesIO(results[0][1]))
+    scale = first.width / (boxes[0][2] - boxes[0][0])
+    output = Image.new("RGB", (round(img.width * scale), round(img.height * scale)))
+
+    # Tile ditempel urut per baris; bagian overlap di-blend dengan ramp linear
+    for box, (_, result) in zip(boxes, results):
+        left, top, right, bottom = box
+        dest = (round(left * scale), round(top * scale))
+        size = (round(right * scale) - dest[0], round(bottom * scale) - dest[1])
+        tile = Image.open(io.BytesIO(result)).convert("RGB")
+        if tile.size != size:
+            tile = tile.resize(size, Image.Resampling.LANCZOS)
+
+        left_overlap = top_overlap = 0
+        for other in boxes:
+            if other is box:
+                break
+            if other[1] == top and other[2] > left:
+                left_overlap = max(left_overlap, other[2] - left)
+            if other[0] <= left < other[2] and other[3] > top and other[1] < top:
+                top_overlap = max(top_overlap, other[3] - top)
+
+        mask = _feather_mask(size, round(left_overlap * scale), round(top_overlap * scale))
+        output.paste(tile, dest, mask)
+
+    return True, encode_jpeg(output)
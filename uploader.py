@@ -1,75 +1,393 @@
 """
 Upload functionality untuk Cloudflare R2
+Upload berjalan di worker pool sendiri (UploadPool) dengan satu client boto3
+bersama, sehingga uplink yang lambat tidak menahan stage enhance.
+
+Dengan JobStore, file besar diupload lewat multipart upload yang resumable:
+UploadId dan ETag per part disimpan, sehingga setelah sleep/restart hanya
+part yang belum ada di R2 yang dikirim.
 """
 
-import boto3
+import atexit
+import io
+import math
+import os
+import queue
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
 from config import (
-    R2_BUCKET, R2_ENDPOINT, R2_ACCESS_KEY, R2_SECRET_KEY, 
-    PUBLIC_DOMAIN, MAX_UPLOAD_RETRIES, UPLOAD_RETRY_DELAY
+    R2_BUCKET, R2_ENDPOINT, R2_ACCESS_KEY, R2_SECRET_KEY,
+    PUBLIC_DOMAIN, MAX_UPLOAD_RETRIES, UPLOAD_RETRY_DELAY,
+    PIPELINE_UPLOAD_WORKERS, UPLOAD_MULTIPART_THRESHOLD, UPLOAD_MULTIPART_CHUNKSIZE,
+    UPLOAD_MAX_CONCURRENCY, R2_POOL_SIZE, MULTIPART_UPLOAD_TTL
 )
 from utils import log_failed_upload, log_public_url
 
 
-# Initialize R2 client
+# Initialize R2 client (thread-safe, dipakai bersama semua worker upload)
 s3 = boto3.client(
     "s3",
     endpoint_url=R2_ENDPOINT,
     aws_access_key_id=R2_ACCESS_KEY,
     aws_secret_access_key=R2_SECRET_KEY,
-    region_name="auto"
+    region_name="auto",
+    config=Config(max_pool_connections=R2_POOL_SIZE)
 )
 
+# Multipart upload: file besar (hasil upscale 4x) dikirim per part secara paralel
+TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=UPLOAD_MULTIPART_THRESHOLD,
+    multipart_chunksize=UPLOAD_MULTIPART_CHUNKSIZE,
+    max_concurrency=UPLOAD_MAX_CONCURRENCY,
+    use_threads=UPLOAD_MAX_CONCURRENCY > 1
+)
+
+# Sentinel untuk menghentikan worker
+_STOP = object()
+
+
+def _upload_once(local_file_path, remote_filename, data=None):
+    """
+    Satu attempt upload ke R2 (tanpa retry)
+
+    Returns:
+        tuple: (success: bool, public_url: str or error_message: str)
+    """
+    try:
+        # Upload dari memory jika ada, kalau tidak dari file
+        if data is not None:
+            s3.upload_fileobj(io.BytesIO(data), R2_BUCKET, remote_filename, Config=TRANSFER_CONFIG)
+        else:
+            s3.upload_file(local_file_path, R2_BUCKET, remote_filename, Config=TRANSFER_CONFIG)
+    except Exception as upload_error:
+        return False, str(upload_error)
+
+    # Generate public URL
+    return True, f"{PUBLIC_DOMAIN}/{remote_filename}"
+
+
+def _error_code(error):
+    """Kode error S3 dari botocore ClientError (None untuk error lain)"""
+    return getattr(error, "response", {}).get("Error", {}).get("Code")
+
+
+def _read_part(local_file_path, data, offset, length):
+    if data is not None:
+        return bytes(memoryview(data)[offset:offset + length])
+    with open(local_file_path, "rb") as f:
+        f.seek(offset)
+        return f.read(length)
+
+
+def _listed_parts(remote_filename, upload_id):
+    """Part yang sudah tersimpan di R2 untuk multipart upload ini: part_number → ETag"""
+    parts = {}
+    kwargs = {"Bucket": R2_BUCKET, "Key": remote_filename, "UploadId": upload_id}
+    while True:
+        response = s3.list_parts(**kwargs)
+        for part in response.get("Parts", []):
+            parts[part["PartNumber"]] = part["ETag"]
+        if not response.get("IsTruncated"):
+            return parts
+        kwargs["PartNumberMarker"] = response["NextPartNumberMarker"]
+
+
+def _abort(remote_filename, upload_id):
+    try:
+        s3.abort_multipart_upload(Bucket=R2_BUCKET, Key=remote_filename, UploadId=upload_id)
+    except Exception as e:
+        if _error_code(e) != "NoSuchUpload":
+            raise
+
 
-def upload_to_r2(local_file_path, remote_filename):
+def upload_multipart(local_file_path, remote_filename, store, data=None, part_size=UPLOAD_MULTIPART_CHUNKSIZE):
     """
-    Upload file ke Cloudflare R2 dengan retry mechanism
-    
+    Multipart upload yang bisa dilanjutkan setelah restart
+
+    State (UploadId, ukuran, ETag per part) disimpan di store. Jika object ini
+    punya multipart upload yang belum selesai, list_parts dipakai untuk
+    mengetahui part mana yang sudah ada di R2; part dengan ETag yang sama
+    dengan catatan lokal tidak dikirim ulang.
+
     Args:
-        local_file_path (str): Path file lokal yang akan diupload
+        local_file_path (str): Path file lokal (dipakai jika data None)
         remote_filename (str): Nama file di R2
-    
+        store (JobStore): Tempat menyimpan state multipart
+        data (bytes): Isi file di memory (sama dengan isi local_file_path)
+        part_size (int): Ukuran per part (semua part kecuali terakhir sama besar)
+
     Returns:
         tuple: (success: bool, public_url: str or error_message: str)
     """
-    upload_success = False
-    
-    for upload_attempt in range(MAX_UPLOAD_RETRIES):
-        try:
-            print(f"☁️ Uploading to R2 (attempt {upload_attempt + 1}/{MAX_UPLOAD_RETRIES})...")
-            
-            # Upload file
-            s3.upload_file(local_file_path, R2_BUCKET, remote_filename)
-            
-            # Generate public URL
-            public_url = f"{PUBLIC_DOMAIN}/{remote_filename}"
-            print(f"✅ Uploaded → {public_url}")
-            
-            # Log public URL
-            log_public_url(public_url)
-            
-            upload_success = True
-            return True, public_url
-            
-        except Exception as upload_error:
-            print(f"⚠️ Upload attempt {upload_attempt + 1} failed: {upload_error}")
-            
-            if upload_attempt < MAX_UPLOAD_RETRIES - 1:
-                print(f"🔄 Retrying in {UPLOAD_RETRY_DELAY} seconds...")
-                time.sleep(UPLOAD_RETRY_DELAY)
+    try:
+        size = len(data) if data is not None else os.path.getsize(local_file_path)
+        count = max(1, math.ceil(size / part_size))
+
+        state = store.get_multipart(remote_filename)
+        if state is not None and (state["size"], state["part_size"]) != (size, part_size):
+            # File atau ukuran part berubah: mulai dari awal
+            _abort(remote_filename, state["upload_id"])
+            store.delete_multipart(remote_filename)
+            state = None
+
+        reusable = {}
+        if state is not None:
+            upload_id = state["upload_id"]
+            try:
+                listed = _listed_parts(remote_filename, upload_id)
+            except Exception as e:
+                if _error_code(e) != "NoSuchUpload":
+                    raise
+                store.delete_multipart(remote_filename)
+                state = None
             else:
-                print(f"❌ Upload failed after {MAX_UPLOAD_RETRIES} attempts")
-                # Log failed upload
-                log_failed_upload(remote_filename, str(upload_error))
-                return False, str(upload_error)
-    
-    return False, "Upload failed after all retries"
+                recorded = store.multipart_parts(remote_filename)
+                reusable = {n: etag for n, etag in listed.items() if recorded.get(n) == etag and n <= count}
+                print(f"⏩ Resuming upload of {remote_filename}: {len(reusable)}/{count} parts already in R2")
+        if state is None:
+            upload_id = s3.create_multipart_upload(Bucket=R2_BUCKET, Key=remote_filename)["UploadId"]
+            store.start_multipart(remote_filename, upload_id, local_file_path, size, part_size)
+
+        def send(number):
+            if number in reusable:
+                return number, reusable[number]
+            offset = (number - 1) * part_size
+            body = _read_part(local_file_path, data, offset, min(part_size, size - offset))
+            etag = s3.upload_part(Bucket=R2_BUCKET, Key=remote_filename, UploadId=upload_id,
+                                  PartNumber=number, Body=body)["ETag"]
+            store.record_part(remote_filename, number, etag)
+            return number, etag
+
+        with ThreadPoolExecutor(max_workers=UPLOAD_MAX_CONCURRENCY) as executor:
+            etags = dict(executor.map(send, range(1, count + 1)))
+
+        s3.complete_multipart_upload(
+            Bucket=R2_BUCKET, Key=remote_filename, UploadId=upload_id,
+            MultipartUpload={"Parts": [{"ETag": etags[n], "PartNumber": n} for n in sorted(etags)]}
+        )
+        store.delete_multipart(remote_filename)
+    except Exception as upload_error:
+        # Upload sudah di-abort (mis. melewati TTL): attempt berikutnya mulai baru
+        if _error_code(upload_error) == "NoSuchUpload":
+            store.delete_multipart(remote_filename)
+        return False, str(upload_error)
+
+    return True, f"{PUBLIC_DOMAIN}/{remote_filename}"
+
+
+def abort_stale_multipart_uploads(store, ttl=MULTIPART_UPLOAD_TTL):
+    """
+    Abort multipart upload yang tidak disentuh lebih dari ttl detik, supaya
+    part yatim tidak menumpuk di R2. Termasuk upload di bucket yang tidak
+    tercatat di store (mis. job store dihapus).
+
+    Returns:
+        int: Jumlah multipart upload yang di-abort
+    """
+    cutoff = time.time() - ttl
+    aborted = 0
+    known = set()
+    for row in store.multipart_uploads():
+        if row["updated_at"] >= cutoff:
+            known.add(row["upload_id"])
+            continue
+        _abort(row["remote_name"], row["upload_id"])
+        store.delete_multipart(row["remote_name"])
+        aborted += 1
+
+    kwargs = {"Bucket": R2_BUCKET}
+    while True:
+        response = s3.list_multipart_uploads(**kwargs)
+        for upload in response.get("Uploads", []):
+            if upload["UploadId"] not in known and upload["Initiated"].timestamp() < cutoff:
+                _abort(upload["Key"], upload["UploadId"])
+                aborted += 1
+        if not response.get("IsTruncated"):
+            return aborted
+        kwargs["KeyMarker"] = response.get("NextKeyMarker")
+        kwargs["UploadIdMarker"] = response.get("NextUploadIdMarker")
+
+
+class UploadTask:
+    """Satu file di UploadPool; hasil (success, public_url or error) ada di future"""
+
+    def __init__(self, local_file_path, remote_filename, data=None):
+        self.local_file_path = local_file_path
+        self.remote_filename = remote_filename
+        self.data = data
+        self.attempt = 0
+        self.future = Future()
+
+    def release(self):
+        """
+        Lepas bytes di memory; attempt berikutnya membaca local_file_path
+        Hanya dipanggil setelah salinan lokal selesai ditulis
+        """
+        self.data = None
+
+
+class UploadPool:
+    """
+    Worker pool khusus upload ke R2, diisi lewat queue
+
+    submit() tidak pernah blocking. Retry dijadwalkan dengan timer dan
+    task masuk kembali ke queue, sehingga worker tidak tidur selama
+    UPLOAD_RETRY_DELAY dan upload lain tetap berjalan.
+
+    Dengan store, file di atas UPLOAD_MULTIPART_THRESHOLD diupload lewat
+    upload_multipart (resumable); tanpa store lewat TransferConfig boto3.
+    """
+
+    def __init__(self, workers=PIPELINE_UPLOAD_WORKERS, retries=MAX_UPLOAD_RETRIES,
+                 retry_delay=UPLOAD_RETRY_DELAY, log_failures=True, store=None):
+        self.workers = max(1, int(workers))
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.log_failures = log_failures  # False: kegagalan dicatat caller (mis. retry queue)
+        self.store = store
+        self._queue = queue.Queue()
+        self._threads = []
+        self._pending = 0  # task yang belum selesai (di queue, sedang upload, atau menunggu retry)
+        self._cond = threading.Condition()
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(target=self._run, name=f"upload-{i + 1}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, local_file_path, remote_filename, data=None):
+        """
+        Masukkan file ke queue upload
+
+        Args:
+            local_file_path (str): Path file lokal (dipakai jika data None)
+            remote_filename (str): Nama file di R2
+            data (bytes): Isi file di memory; jika diisi, diupload tanpa membaca disk
+
+        Returns:
+            UploadTask: future berisi (success: bool, public_url or error_message)
+        """
+        task = UploadTask(local_file_path, remote_filename, data)
+        with self._cond:
+            self._pending += 1
+        self._queue.put(task)
+        return task
+
+    def backlog(self):
+        """Jumlah file yang menunggu di queue"""
+        return self._queue.qsize()
+
+    def stop(self):
+        """Tunggu semua upload (termasuk retry yang terjadwal) selesai lalu hentikan worker"""
+        with self._cond:
+            while self._pending:
+                self._cond.wait()
+        for _ in self._threads:
+            self._queue.put(_STOP)
+        for t in self._threads:
+            t.join()
+        self._threads = []
+
+    def _run(self):
+        while True:
+            task = self._queue.get()
+            if task is _STOP:
+                break
+            task.attempt += 1
+            print(f"☁️ Uploading {task.remote_filename} to R2 (attempt {task.attempt}/{self.retries})...")
+            success, result = self._upload(task)
+
+            if success:
+                print(f"✅ Uploaded → {result}")
+                log_public_url(result)
+            else:
+                print(f"⚠️ Upload attempt {task.attempt} failed: {result}")
+                if task.attempt < self.retries:
+                    print(f"🔄 Retrying {task.remote_filename} in {self.retry_delay} seconds...")
+                    timer = threading.Timer(self.retry_delay, self._queue.put, args=(task,))
+                    timer.daemon = True
+                    timer.start()
+                    continue
+                print(f"❌ Upload failed after {self.retries} attempts")
+                if self.log_failures:
+                    log_failed_upload(task.remote_filename, result)
+            self._finish(task, success, result)
+
+    def _upload(self, task):
+        data = task.data
+        if self.store is not None:
+            try:
+                size = len(data) if data is not None else os.path.getsize(task.local_file_path)
+            except OSError as e:
+                return False, str(e)
+            if size >= UPLOAD_MULTIPART_THRESHOLD:
+                return upload_multipart(task.local_file_path, task.remote_filename, self.store, data)
+        return _upload_once(task.local_file_path, task.remote_filename, data)
+
+    def _finish(self, task, success, result):
+        task.data = None
+        try:
+            task.future.set_result((success, result))
+        finally:
+            with self._cond:
+                self._pending -= 1
+                self._cond.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_upload_pool():
+    """UploadPool bersama (dijalankan saat pertama dipakai, di-drain saat exit)"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = UploadPool()
+            _pool.start()
+            atexit.register(_pool.stop)
+        return _pool
+
+
+def upload_to_r2(local_file_path, remote_filename, data=None):
+    """
+    Upload file ke Cloudflare R2 dengan retry mechanism (menunggu sampai selesai)
+
+    Args:
+        local_file_path (str): Path file lokal yang akan diupload
+        remote_filename (str): Nama file di R2
+        data (bytes): Isi file yang sudah ada di memory; jika diisi, diupload
+            langsung dari memory tanpa membaca local_file_path
+
+    Returns:
+        tuple: (success: bool, public_url: str or error_message: str)
+    """
+    return get_upload_pool().submit(local_file_path, remote_filename, data).future.result()
+
+
+def r2_reachable():
+    """
+    Cek koneksi ke bucket R2 tanpa output (dipakai reconciler untuk deteksi online)
+
+    Returns:
+        bool: True jika bucket bisa dihubungi
+    """
+    try:
+        s3.head_bucket(Bucket=R2_BUCKET)
+        return True
+    except Exception:
+        return False
 
 
 def check_r2_connection():
     """
     Test koneksi ke R2
-    
+
     Returns:
         bool: True jika koneksi berhasil
     """
@@ -80,4 +398,4 @@ def check_r2_connection():
         return True
     except Exception as e:
         print(f"❌ R2 connection failed: {e}")
-        return False
\ No newline at end of file
+        return False
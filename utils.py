@@ -2,12 +2,18 @@
 Utility functions untuk auto photo processing workflow
 """
 
+import io
 import os
 import time
-from PIL import Image
+import sys
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageChops
 from config import (
-    COUNTER_FILE, FILE_STABILITY_CHECKS, FILE_STABILITY_INTERVAL, 
-    IMAGE_OPEN_RETRIES, WATERMARK_FILE
+    COUNTER_FILE, FILE_STABILITY_CHECKS, FILE_STABILITY_INTERVAL, FILE_COMPLETE_TIMEOUT,
+    IMAGE_OPEN_RETRIES, WATERMARK_FILE, WATERMARK_CACHE_SIZE, JPEG_QUALITY
 )
 
 
@@ -27,14 +33,17 @@ def save_counter(n):
         f.write(str(n))
 
 
-def wait_until_complete(path, checks=FILE_STABILITY_CHECKS, interval=FILE_STABILITY_INTERVAL):
+def wait_until_complete(path, checks=FILE_STABILITY_CHECKS, interval=FILE_STABILITY_INTERVAL,
+                        timeout=FILE_COMPLETE_TIMEOUT):
     """
     Tunggu sampai file selesai di-copy/transfer
-    Mengecek stabilitas ukuran file
+    Mengecek stabilitas ukuran file; terus menunggu selama file masih bertambah,
+    dan baru menyerah jika ukuran tidak berubah (atau file tidak ada) selama timeout
     """
     last_size = -1
     stable_count = 0
-    for _ in range(20):
+    last_change = time.time()
+    while True:
         try:
             size = os.path.getsize(path)
         except FileNotFoundError:
@@ -45,9 +54,27 @@ def wait_until_complete(path, checks=FILE_STABILITY_CHECKS, interval=FILE_STABIL
                 return True
         else:
             stable_count = 0
+            if size != last_size:
+                last_change = time.time()
             last_size = size
+        if time.time() - last_change > timeout:
+            print(f"⚠️ File not complete after {timeout}s: {os.path.basename(path)}")
+            return False
         time.sleep(interval)
-    return False
+
+
+def file_hash(path, chunk_size=1024 * 1024):
+    """
+    Hitung SHA-256 isi file (dibaca per chunk supaya hemat memory)
+    
+    Returns:
+        str: Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
 
 
 def safe_open_image(path, retries=IMAGE_OPEN_RETRIES):
@@ -66,51 +93,172 @@ def safe_open_image(path, retries=IMAGE_OPEN_RETRIES):
     raise RuntimeError(f"Gagal membuka gambar setelah {retries}x percobaan: {os.path.basename(path)}")
 
 
-def add_watermark(img: Image.Image, watermark_path: str = WATERMARK_FILE) -> Image.Image:
+# ioctl FICLONE (Linux): reflink copy-on-write di btrfs/XFS
+_FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    import fcntl
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        try:
+            fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+        except OSError:
+            fdst.close()
+            os.remove(dst)
+            raise
+
+
+def _copy_file_range(src, dst):
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        remaining = os.fstat(fsrc.fileno()).st_size
+        while remaining > 0:
+            copied = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+            if copied == 0:
+                break
+            remaining -= copied
+    shutil.copystat(src, dst)
+
+
+def copy_file_fast(src, dst):
+    """
+    Copy file byte-for-byte tanpa lewat Python buffer jika memungkinkan
+    Urutan: reflink → hardlink → copy_file_range → shutil.copy2
+    (tiga cara pertama hanya berhasil jika src dan dst di filesystem yang sama)
+    
+    Returns:
+        str: Metode yang dipakai
+    """
+    if os.path.exists(dst):
+        if os.path.samefile(src, dst):
+            return "existing"
+        os.remove(dst)
+
+    if sys.platform.startswith("linux"):
+        try:
+            _reflink(src, dst)
+            shutil.copystat(src, dst)
+            return "reflink"
+        except OSError:
+            pass
+
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        pass
+
+    if hasattr(os, "copy_file_range"):
+        try:
+            _copy_file_range(src, dst)
+            return "copy_file_range"
+        except OSError:
+            pass
+
+    shutil.copy2(src, dst)
+    return "copy"
+
+
+def encode_jpeg(img, quality=JPEG_QUALITY):
+    """
+    Encode image ke JPEG di memory
+    
+    Returns:
+        bytes: JPEG data
+    """
+    buffer = io.BytesIO()
+    img.convert("RGB").save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+# Cache watermark: (path, mtime_ns, width) → (blend RGB, blend mask), LRU
+_watermark_cache = OrderedDict()
+_watermark_source = {}
+_watermark_lock = threading.Lock()
+
+
+def get_watermark(watermark_path, width):
+    """
+    Ambil watermark yang sudah di-resize ke lebar tertentu (cached)
+    Cache otomatis invalid jika file watermark berubah (mtime)
+    
+    Hasilnya siap di-paste langsung ke foto RGB dan menghasilkan pixel yang sama
+    dengan compositing lama (paste ke overlay transparan lalu alpha_composite):
+    warna = RGB * alpha, mask = alpha * alpha.
+    
+    Returns:
+        tuple: (watermark: PIL.Image RGB, mask: PIL.Image L)
+    """
+    mtime_ns = os.stat(watermark_path).st_mtime_ns
+    key = (watermark_path, mtime_ns, width)
+    with _watermark_lock:
+        cached = _watermark_cache.get(key)
+        if cached is not None:
+            _watermark_cache.move_to_end(key)
+            return cached
+
+        # Load PNG sekali per versi file
+        source_key = (watermark_path, mtime_ns)
+        source = _watermark_source.get(watermark_path)
+        if source is None or source[0] != source_key:
+            source = (source_key, Image.open(watermark_path).convert("RGBA"))
+            _watermark_source[watermark_path] = source
+        watermark = source[1]
+
+        # Maintain aspect ratio
+        height = int(width * watermark.size[1] / watermark.size[0])
+        resized = watermark.resize((width, height), Image.Resampling.LANCZOS)
+
+        alpha = resized.getchannel("A")
+        rgb = ImageChops.multiply(resized.convert("RGB"), Image.merge("RGB", (alpha, alpha, alpha)))
+        cached = (rgb, ImageChops.multiply(alpha, alpha))
+
+        _watermark_cache[key] = cached
+        while len(_watermark_cache) > WATERMARK_CACHE_SIZE:
+            _watermark_cache.popitem(last=False)
+        return cached
+
+
+def add_watermark(img: Image.Image, watermark_path: str = WATERMARK_FILE, in_place: bool = False) -> Image.Image:
     """
     Tambahkan watermark PNG transparent di bagian bawah foto
+    
+    Blending hanya menyentuh bounding box watermark (paste dengan alpha mask),
+    jadi memory dan waktu sebanding dengan ukuran watermark, bukan megapixel foto.
+    Dengan in_place=True, image RGB diubah langsung tanpa copy full-frame.
     """
     if not os.path.exists(watermark_path):
         print(f"⚠️ Watermark file not found: {watermark_path}")
         return img
 
     try:
-        # Load watermark
-        watermark = Image.open(watermark_path).convert("RGBA")
-
         # Calculate watermark size (15% of image width)
         img_width, img_height = img.size
         watermark_width = int(img_width * 0.15)
 
-        # Maintain aspect ratio
-        watermark_ratio = watermark.size[1] / watermark.size[0]
-        watermark_height = int(watermark_width * watermark_ratio)
-
-        # Resize watermark
-        watermark = watermark.resize((watermark_width, watermark_height), Image.Resampling.LANCZOS)
+        # Load + resize watermark (cached per ukuran)
+        watermark, mask = get_watermark(watermark_path, watermark_width)
+        watermark_height = watermark.size[1]
 
         # Position watermark (bottom center, with offset)
         offset_from_bottom = 50  # pixels from bottom
         x_position = (img_width - watermark_width) // 2
         y_position = img_height - watermark_height - offset_from_bottom
 
-        # Convert main image to RGBA for transparency support
-        if img.mode != 'RGBA':
-            img = img.convert('RGBA')
-
-        # Create a transparent overlay
-        overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-        overlay.paste(watermark, (x_position, y_position), watermark)
+        # Pastikan target RGB; image transparan di-flatten ke background putih
+        if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        elif img.mode != "RGB":
+            img = img.convert("RGB")
+        elif not in_place:
+            img = img.copy()
 
-        # Composite the images
-        watermarked = Image.alpha_composite(img, overlay)
-
-        # Convert back to RGB
-        final_img = Image.new('RGB', watermarked.size, (255, 255, 255))
-        final_img.paste(watermarked, mask=watermarked.split()[-1])
+        # Alpha blend hanya di area watermark
+        img.paste(watermark, (x_position, y_position), mask)
 
         print(f"🏷️ Watermark added: {watermark_width}x{watermark_height} at ({x_position}, {y_position})")
-        return final_img
+        return img
 
     except Exception as e:
         print(f"⚠️ Watermark failed: {e}")
@@ -0,0 +1,116 @@
+"""
+Pre-warming container Cerebrium berdasarkan aktivitas ingest
+Foto pertama setelah idle biasanya kena cold start (GFPGAN + Real-ESRGAN bisa
+puluhan detik). Begitu file baru muncul di input folder, request kecil dikirim
+duluan, sehingga container sudah hangat saat foto selesai ditransfer.
+"""
+
+import threading
+import time
+from datetime import datetime
+from PIL import Image
+from config import (
+    CEREBRIUM_ENDPOINTS, PREWARM_IDLE_AFTER, PREWARM_TASK,
+    PREWARM_COLD_THRESHOLD, KEEP_WARM_WINDOW, KEEP_WARM_INTERVAL
+)
+from utils import encode_jpeg
+from enhance_image_cerebrium import get_client
+
+
+def in_window(window, now=None):
+    """
+    True jika jam sekarang ada di window ("HH:MM", "HH:MM"); window yang
+    melewati tengah malam (mis. ("18:00", "02:00")) juga didukung
+    """
+    if not window:
+        return False
+    now = (now or datetime.now()).strftime("%H:%M")
+    start, end = window
+    if start <= end:
+        return start <= now < end
+    return now >= start or now < end
+
+
+class Prewarmer:
+    """
+    Kirim warm-up request saat aktivitas ingest dimulai setelah idle, dan
+    (opsional) ping berkala selama KEEP_WARM_WINDOW
+
+    notify_activity() dipanggil dari watcher setiap ada file baru; hanya
+    aktivitas pertama setelah PREWARM_IDLE_AFTER detik yang memicu warm-up.
+    """
+
+    def __init__(self, endpoints=CEREBRIUM_ENDPOINTS, idle_after=PREWARM_IDLE_AFTER, task=PREWARM_TASK,
+                 window=KEEP_WARM_WINDOW, interval=KEEP_WARM_INTERVAL):
+        self.endpoints = endpoints
+        self.idle_after = idle_after
+        self.task = task
+        self.window = window
+        self.interval = interval
+        self.last_activity = 0.0
+        self.last_warmup = 0.0
+        self.cold_starts = []  # latency (detik) warm-up yang terdeteksi cold start
+        self._payload = encode_jpeg(Image.new("RGB", (16, 16), "gray"))
+        self._lock = threading.Lock()
+        self._warming = 0
+        self._stop = threading.Event()
+        self._pinger = None
+
+    def start(self):
+        if self.window:
+            self._pinger = threading.Thread(target=self._keep_warm_loop, name="keep-warm", daemon=True)
+            self._pinger.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._pinger is not None:
+            self._pinger.join()
+
+    def notify_activity(self):
+        """File baru / transfer sedang berjalan: warm-up jika endpoint sudah lama idle"""
+        now = time.time()
+        with self._lock:
+            idle = now - max(self.last_activity, self.last_warmup) >= self.idle_after
+            self.last_activity = now
+        if idle:
+            self.warm_up("ingest activity after idle")
+
+    def warm_up(self, reason):
+        """Kirim warm-up request ke setiap endpoint di background (skip jika masih ada yang berjalan)"""
+        with self._lock:
+            if self._warming:
+                return
+            self._warming = len(self.endpoints)
+        print(f"🔥 Pre-warming Cerebrium ({reason})...")
+        for endpoint in self.endpoints:
+            threading.Thread(target=self._send, args=(endpoint,), name="prewarm", daemon=True).start()
+
+    def _send(self, endpoint):
+        started = time.time()
+        try:
+            client = get_client(endpoint["url"], endpoint.get("token"))
+            success, result = client.enhance(self.task, image_bytes=self._payload)
+        except Exception as e:
+            success, result = False, str(e)
+        latency = time.time() - started
+        with self._lock:
+            self._warming -= 1
+            self.last_warmup = time.time()
+
+        label = endpoint["url"] if len(self.endpoints) > 1 else "Cerebrium"
+        if not success:
+            print(f"⚠️ Warm-up request to {label} failed after {latency:.1f}s: {result}")
+        elif latency >= PREWARM_COLD_THRESHOLD:
+            self.cold_starts.append(latency)
+            print(f"🧊 Cold start observed: {label} ready after {latency:.1f}s")
+        else:
+            print(f"♨️ {label} already warm ({latency:.1f}s)")
+
+    def _keep_warm_loop(self):
+        while not self._stop.wait(min(60, self.interval)):
+            if not in_window(self.window):
+                continue
+            with self._lock:
+                last = max(self.last_activity, self.last_warmup)
+            if time.time() - last >= self.interval:
+                self.warm_up("keep-warm window")